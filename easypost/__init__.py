@@ -1,14 +1,27 @@
+import contextlib
 import datetime
+import email.utils
 import json
 import platform
+import random
 import re
 import six
 import ssl
+import threading
 import time
 import types
+import uuid
 
 from six.moves.urllib.parse import urlencode, quote_plus, urlparse
 
+from .cache import (  # noqa: F401
+    AddressVerificationCache,
+    CreatedObjectCache,
+    FileCache,
+    LRUCache,
+    SQLiteCache,
+    TTLCache,
+)
 from .version import VERSION, VERSION_INFO
 
 __author__ = 'EasyPost <oss@easypost.com>'
@@ -50,23 +63,77 @@ except ImportError:
                               'requests via "pip install -U requests" or contact us '
                               'at contact@easypost.com.')
 
+# use a faster JSON decoder for webhook payloads when one is installed
+try:
+    import orjson as fast_json
+except ImportError:
+    fast_json = None
+
 # config
 api_key = None
 api_base = 'https://api.easypost.com/v2'
-# use our default timeout, or our max timeout if that is less
+# use our default timeout, or our max timeout if that is less; may also be a (connect, read) tuple
 timeout = min(60, _max_timeout)
+# per-endpoint timeouts as (regex, timeout) pairs matched against the request path, first match wins,
+# e.g. [(r'^/trackers/', 5), (r'^/batches', (3.05, 90))]
+endpoint_timeouts = []
+# merge identical concurrent GET requests into a single network call
+coalesce_requests = False
+# set to a cache (e.g. `easypost.TTLCache(ttl=3600)`) to reuse near-static reference data
+# such as carrier types, carrier accounts, users and API keys; writes drop the cached reads they affect
+# through the cache's `invalidate(url)`, which every easypost cache backend provides
+reference_cache = None
+# set to a cache backend (e.g. `easypost.LRUCache()` or `easypost.FileCache(path)`) to send conditional
+# GET requests and reuse the cached response when the API answers 304 Not Modified
+response_cache = None
+# set to an `easypost.AddressVerificationCache` to skip verifying the same address twice
+address_verification_cache = None
+# set to an `easypost.CreatedObjectCache` to reuse addresses, parcels and customs objects created with
+# identical params, and to send `{'id': ...}` instead of their full payload when nested in other requests
+created_object_cache = None
+# retry GET requests, and writes sent with an idempotency key, after connection errors and 409/429/5xx responses
+max_network_retries = 0
+# seconds before the first retry; doubled for each further retry, with jitter
+retry_backoff = 0.5
+_max_retry_backoff = 8
+# set to an `easypost.HedgePolicy` to send a second GET request when the first one is slow
+hedge_policy = None
+# set to an `easypost.LatencyTracker` to keep latency histograms per endpoint; requests to endpoints without
+# an explicit timeout then get a read timeout derived from their own latency
+latency_stats = None
+# set to an `easypost.CircuitBreaker` to fail fast with `CircuitOpenError` while an endpoint keeps failing
+circuit_breaker = None
+# set to an `easypost.RequestScheduler` to cap concurrent requests and keep capacity free for interactive ones
+request_scheduler = None
 
 
 USER_AGENT = 'EasyPost/v2 PythonClient/{0}'.format(VERSION)
 
+RETRYABLE_STATUSES = (408, 409, 429)
+
+# nested request fields whose payload may be replaced by the id of an identical, already created object
+CONTENT_ADDRESSED_FIELDS = {
+    'address': 'address',
+    'to_address': 'address',
+    'from_address': 'address',
+    'return_address': 'address',
+    'buyer_address': 'address',
+    'parcel': 'parcel',
+    'customs_info': 'customs_info',
+    'customs_items': 'customs_item',
+}
+
 
 class Error(Exception):
-    def __init__(self, message=None, http_status=None, http_body=None, original_exception=None):
+    def __init__(self, message=None, http_status=None, http_body=None, original_exception=None, http_headers=None):
         super(Error, self).__init__(message)
         self.message = message
         self.http_status = http_status
         self.http_body = http_body
         self.original_exception = original_exception
+        self.http_headers = http_headers
+        # seconds the API asked us to wait before trying again, if it said so
+        self.retry_after = _parse_retry_after(_get_header(http_headers, 'Retry-After'))
         try:
             self.json_body = json.loads(http_body)
         except Exception:
@@ -78,6 +145,215 @@ class Error(Exception):
         except Exception:
             pass
 
+    @property
+    def retryable(self):
+        # whether sending the same request again may succeed
+        return _is_retryable_status(self.http_status)
+
+
+class APIConnectionError(Error):
+    retryable = True
+
+
+class RequestTimeoutError(APIConnectionError):
+    pass
+
+
+class DeadlineExceededError(RequestTimeoutError):
+    # the deadline set with `request_options` ran out before the request could be sent; sending it again
+    # cannot help
+    retryable = False
+
+
+class ServerError(Error):
+    pass
+
+
+class RateLimitError(Error):
+    pass
+
+
+class InvalidRequestError(Error):
+    pass
+
+
+class PaymentError(Error):
+    pass
+
+
+class NotFoundError(Error):
+    pass
+
+
+class CircuitOpenError(Error):
+    # worth retrying, but only once `retry_after` seconds have passed
+    retryable = True
+
+    def __init__(self, message=None, retry_after=None):
+        super(CircuitOpenError, self).__init__(message)
+        self.retry_after = retry_after
+
+
+ERROR_CLASSES = {
+    400: InvalidRequestError,
+    402: PaymentError,
+    404: NotFoundError,
+    408: RequestTimeoutError,
+    422: InvalidRequestError,
+    429: RateLimitError,
+}
+
+
+def _error_class(http_status):
+    if http_status is not None and http_status >= 500:
+        return ServerError
+    return ERROR_CLASSES.get(http_status, Error)
+
+
+def _is_retryable_status(http_status):
+    return http_status is not None and (http_status in RETRYABLE_STATUSES or http_status >= 500)
+
+
+def _parse_retry_after(value):
+    # either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(email.utils.mktime_tz(parsed) - time.time(), 0)
+
+
+class _InFlightCall(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _SingleFlight(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _InFlightCall()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+_in_flight_requests = _SingleFlight()
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def request_options(timeout=None, deadline=None, priority=None):
+    # override the timeout of every request made by this thread inside the block, and bound them all,
+    # retries included, by a deadline in seconds from now. `priority` is "interactive" (the default) or
+    # "bulk", for `request_scheduler`
+    previous = getattr(_local, 'options', {})
+    options = dict(previous)
+    if timeout is not None:
+        options['timeout'] = timeout
+    if priority is not None:
+        options['priority'] = priority
+    if deadline is not None:
+        deadline_at = time.time() + deadline
+        options['deadline'] = min(deadline_at, previous.get('deadline', deadline_at))
+    _local.options = options
+    try:
+        yield
+    finally:
+        _local.options = previous
+
+
+def _request_option(name):
+    return getattr(_local, 'options', {}).get(name)
+
+
+# id prefix: name of the object type the id belongs to
+ID_PREFIXES = {
+    'adr': 'Address',
+    'sf': 'ScanForm',
+    'evt': 'Event',
+    'cstitem': 'CustomsItem',
+    'cstinfo': 'CustomsInfo',
+    'prcl': 'Parcel',
+    'shp': 'Shipment',
+    'ins': 'Insurance',
+    'rate': 'Rate',
+    'rfnd': 'Refund',
+    'batch': 'Batch',
+    'trk': 'Tracker',
+    'order': 'Order',
+    'pickup': 'Pickup',
+    'pickuprate': 'PickupRate',
+    'pl': 'PostageLabel',
+    'ca': 'CarrierAccount',
+    'user': 'User',
+    'shprep': 'Report',
+    'plrep': 'Report',
+    'trkrep': 'Report',
+    'refrep': 'Report',
+    'shpinvrep': 'Report',
+    'hook': 'Webhook'
+}
+
+_OBJECT_ID = re.compile(r'^([a-z]+)_[0-9a-zA-Z]+$')
+
+
+def _is_object_id(part):
+    # resource names such as "carrier_accounts" have the same shape as ids, so the prefix must be known
+    match = _OBJECT_ID.match(part)
+    return match is not None and match.group(1) in ID_PREFIXES
+
+
+def _endpoint_group(method, url):
+    # "GET /shipments/shp_123/rates" and "GET /shipments/shp_456/rates" share the group
+    # "GET /shipments/:id/rates"
+    path = url.split('?')[0]
+    parts = [':id' if _is_object_id(part) else part for part in path.split('/')]
+    return '%s %s' % (method.upper(), '/'.join(parts))
+
+
+def _get_header(headers, name):
+    if not headers:
+        return None
+    name = name.lower()
+    for k, v in six.iteritems(headers):
+        if k.lower() == name:
+            return v
+    return None
+
+
+def _idempotency_key(idempotency_key=None):
+    # one key per logical operation, reused by every retry of it
+    return idempotency_key or str(uuid.uuid4())
+
 
 def convert_to_easypost_object(response, api_key, parent=None, name=None):
     types = {
@@ -108,33 +384,6 @@ def convert_to_easypost_object(response, api_key, parent=None, name=None):
         'Webhook': Webhook
     }
 
-    prefixes = {
-        'adr': Address,
-        'sf': ScanForm,
-        'evt': Event,
-        'cstitem': CustomsItem,
-        'cstinfo': CustomsInfo,
-        'prcl': Parcel,
-        'shp': Shipment,
-        'ins': Insurance,
-        'rate': Rate,
-        'rfnd': Refund,
-        'batch': Batch,
-        'trk': Tracker,
-        'order': Order,
-        'pickup': Pickup,
-        'pickuprate': PickupRate,
-        'pl': PostageLabel,
-        'ca': CarrierAccount,
-        'user': User,
-        'shprep': Report,
-        'plrep': Report,
-        'trkrep': Report,
-        'refrep': Report,
-        'shpinvrep': Report,
-        'hook': Webhook
-    }
-
     if isinstance(response, list):
         return [convert_to_easypost_object(r, api_key, parent) for r in response]
     elif isinstance(response, dict):
@@ -144,7 +393,7 @@ def convert_to_easypost_object(response, api_key, parent=None, name=None):
         if isinstance(cls_name, six.string_types):
             cls = types.get(cls_name, EasyPostObject)
         elif cls_id is not None:
-            cls = prefixes.get(cls_id[0:cls_id.find('_')], EasyPostObject)
+            cls = types.get(ID_PREFIXES.get(cls_id[0:cls_id.find('_')]), EasyPostObject)
         else:
             cls = EasyPostObject
         return cls.construct_from(response, api_key, parent, name)
@@ -232,18 +481,25 @@ class Requestor(object):
         return out
 
     @classmethod
-    def _objects_to_ids(cls, param):
+    def _objects_to_ids(cls, param, api_key=None, name=None, depth=0):
         if isinstance(param, Resource):
             return {'id': param.id}
         elif isinstance(param, dict):
+            # only nested payloads are substituted, never the object a request is creating itself
+            if (depth >= 2 and api_key is not None and created_object_cache is not None and
+                    name in CONTENT_ADDRESSED_FIELDS):
+                created_id = created_object_cache.created_id(
+                    api_key, CONTENT_ADDRESSED_FIELDS[name], cls._objects_to_ids(param))
+                if created_id is not None:
+                    return {'id': created_id}
             out = {}
             for k, v in six.iteritems(param):
-                out[k] = cls._objects_to_ids(v)
+                out[k] = cls._objects_to_ids(v, api_key, k, depth + 1)
             return out
         elif isinstance(param, list):
             out = []
             for k, v in enumerate(param):
-                out.append(cls._objects_to_ids(v))
+                out.append(cls._objects_to_ids(v, api_key, name, depth))
             return out
         else:
             return param
@@ -260,14 +516,161 @@ class Requestor(object):
         else:
             return '%s?%s' % (url, cls.encode(params))
 
-    def request(self, method, url, params=None, apiKeyRequired=True):
+    def request(self, method, url, params=None, apiKeyRequired=True, cache=None, idempotency_key=None):
         if params is None:
             params = {}
-        http_body, http_status, my_api_key = self.request_raw(method, url, params, apiKeyRequired)
-        response = self.interpret_response(http_body, http_status)
+        if method.lower() != 'get':
+            try:
+                return self._request(method, url, params, apiKeyRequired, idempotency_key=idempotency_key)
+            finally:
+                if getattr(reference_cache, 'invalidate', None) is not None:
+                    # any write to a collection drops the cached reads of that collection; only once the write
+                    # has finished, so a read racing with it cannot cache the old data again
+                    reference_cache.invalidate('/' + url.lstrip('/').split('/')[0].split('?')[0])
+        if cache is None and not coalesce_requests and response_cache is None:
+            return self._request(method, url, params, apiKeyRequired)
+
+        key = (self._api_key or api_key, url, self.encode(self._objects_to_ids(params)))
+        if cache is not None:
+            response = cache.get(key)
+            if response is not None:
+                return response, key[0]
+
+        if coalesce_requests:
+            # callers waiting on the same in-flight GET share its parsed response
+            result = _in_flight_requests.do(key, lambda: self._request(method, url, params, apiKeyRequired, key))
+        else:
+            result = self._request(method, url, params, apiKeyRequired, key)
+
+        if cache is not None:
+            cache.set(key, result[0])
+        return result
+
+    @classmethod
+    def _timeout_for(cls, method, url):
+        request_timeout = _request_option('timeout')
+        adaptive = False
+        if request_timeout is None:
+            request_timeout = timeout
+            adaptive = latency_stats is not None
+            for pattern, endpoint_timeout in endpoint_timeouts:
+                if re.search(pattern, url):
+                    request_timeout = endpoint_timeout
+                    adaptive = False
+                    break
+        if isinstance(request_timeout, (tuple, list)):
+            connect_timeout, read_timeout = request_timeout
+        else:
+            connect_timeout = read_timeout = request_timeout
+        if max(connect_timeout, read_timeout) > _max_timeout:
+            raise Error("`timeout` must not exceed %d; it is %r" % (_max_timeout, request_timeout))
+
+        if adaptive:
+            # the configured timeout stays the upper bound until the endpoint has enough history
+            derived = latency_stats.timeout_for(_endpoint_group(method, url))
+            if derived is not None:
+                read_timeout = min(derived, read_timeout)
+
+        deadline = _request_option('deadline')
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise DeadlineExceededError('Request deadline exceeded before %s could be sent' % url)
+            connect_timeout = min(connect_timeout, remaining)
+            read_timeout = min(read_timeout, remaining)
+        return connect_timeout, read_timeout
+
+    @classmethod
+    def _should_retry(cls, method, headers, attempt, delay=0):
+        if attempt >= max_network_retries:
+            return False
+        deadline = _request_option('deadline')
+        if deadline is not None and time.time() + delay >= deadline:
+            return False
+        # a write is only safe to repeat when the API can recognise it by its idempotency key
+        return method.lower() == 'get' or 'Idempotency-Key' in headers
+
+    @classmethod
+    def _retry_delay(cls, attempt):
+        delay = min(retry_backoff * 2 ** attempt, _max_retry_backoff)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _request_with_retries(self, method, url, params, apiKeyRequired, headers):
+        breaker = circuit_breaker
+        if breaker is not None:
+            my_api_key = self._api_key or api_key
+            group = _endpoint_group(method, url)
+        attempt = 0
+        while True:
+            if breaker is not None:
+                token = breaker.before(my_api_key, group)
+            result = error = None
+            try:
+                result = self._request_raw(method, url, params, apiKeyRequired, headers)
+            except Error as e:
+                if not e.retryable:
+                    # raised before the request was sent
+                    if breaker is not None:
+                        breaker.record(my_api_key, group, None, token)
+                    raise
+                error = e
+                retryable, retry_after = True, e.retry_after
+            else:
+                retryable = _is_retryable_status(result[1])
+                retry_after = _parse_retry_after(_get_header(result[2], 'Retry-After')) if retryable else None
+            if breaker is not None:
+                breaker.record(my_api_key, group, retryable, token)
+            delay = max(self._retry_delay(attempt), retry_after or 0)
+            if not retryable or not self._should_retry(method, headers, attempt, delay):
+                if error is not None:
+                    raise error
+                return result
+            time.sleep(delay)
+            attempt += 1
+
+    def _request(self, method, url, params, apiKeyRequired, key=None, idempotency_key=None):
+        cached = None
+        headers = {}
+        if idempotency_key is not None:
+            headers['Idempotency-Key'] = idempotency_key
+        if key is not None and response_cache is not None:
+            cached = response_cache.get(key)
+            if cached is not None:
+                if cached.get('etag'):
+                    headers['If-None-Match'] = cached['etag']
+                if cached.get('last_modified'):
+                    headers['If-Modified-Since'] = cached['last_modified']
+
+        if hedge_policy is not None and method.lower() == 'get':
+            options = getattr(_local, 'options', {})
+
+            def send():
+                # hedged attempts run on their own threads, under the caller's request options
+                _local.options = options
+                return self._request_with_retries(method, url, params, apiKeyRequired, headers)
+
+            http_body, http_status, http_headers, my_api_key = hedge_policy.call(send, _endpoint_group(method, url))
+        else:
+            http_body, http_status, http_headers, my_api_key = self._request_with_retries(
+                method, url, params, apiKeyRequired, headers)
+
+        if http_status == 304 and cached is not None:
+            return cached['response'], my_api_key
+
+        response = self.interpret_response(http_body, http_status, http_headers)
+
+        if key is not None and response_cache is not None:
+            etag = _get_header(http_headers, 'ETag')
+            last_modified = _get_header(http_headers, 'Last-Modified')
+            if etag or last_modified:
+                response_cache.set(key, {'etag': etag, 'last_modified': last_modified, 'response': response})
         return response, my_api_key
 
     def request_raw(self, method, url, params=None, apiKeyRequired=True):
+        http_body, http_status, _, my_api_key = self._request_raw(method, url, params, apiKeyRequired)
+        return http_body, http_status, my_api_key
+
+    def _request_raw(self, method, url, params=None, apiKeyRequired=True, extra_headers=None):
         if params is None:
             params = {}
         my_api_key = self._api_key or api_key
@@ -279,7 +682,7 @@ class Requestor(object):
                 'at contact@easypost.com for assistance.')
 
         abs_url = self.api_url(url)
-        params = self._objects_to_ids(params)
+        params = self._objects_to_ids(params, my_api_key)
 
         ua = {
             'client_version': VERSION,
@@ -305,30 +708,53 @@ class Requestor(object):
             'Authorization': 'Bearer %s' % my_api_key,
             'Content-type': 'application/x-www-form-urlencoded'
         }
+        if extra_headers:
+            headers.update(extra_headers)
 
-        if timeout > _max_timeout:
-            raise Error("`timeout` must not exceed %d; it is %d" % (_max_timeout, timeout))
-
-        if request_lib == 'urlfetch':
-            http_body, http_status = self.urlfetch_request(method, abs_url, headers, params)
-        elif request_lib == 'requests':
-            http_body, http_status = self.requests_request(method, abs_url, headers, params)
-        else:
-            raise Error("Bug discovered: invalid request_lib: %s. "
-                        "Please report to contact@easypost.com." % request_lib)
-
-        return http_body, http_status, my_api_key
-
-    def interpret_response(self, http_body, http_status):
+        scheduler = request_scheduler
+        if scheduler is not None:
+            priority = _request_option('priority') or 'interactive'
+            scheduler.acquire(priority, _request_option('deadline'))
+        try:
+            # time spent waiting for a slot counts against the deadline, but not toward the endpoint's latency
+            # computed per attempt and passed along, since hedged attempts share this requestor across threads
+            request_timeout = self._timeout_for(method, url)
+            started = time.time() if latency_stats is not None else None
+            try:
+                if request_lib == 'urlfetch':
+                    http_body, http_status, http_headers = self.urlfetch_request(
+                        method, abs_url, headers, params, request_timeout)
+                elif request_lib == 'requests':
+                    http_body, http_status, http_headers = self.requests_request(
+                        method, abs_url, headers, params, request_timeout)
+                else:
+                    raise Error("Bug discovered: invalid request_lib: %s. "
+                                "Please report to contact@easypost.com." % request_lib)
+            except RequestTimeoutError:
+                # a timed-out attempt took at least its read timeout; leaving it out would pull the percentiles,
+                # and the timeouts derived from them, toward the responses that did arrive
+                if latency_stats is not None:
+                    latency_stats.record(_endpoint_group(method, url), max(time.time() - started, request_timeout[1]))
+                raise
+        finally:
+            if scheduler is not None:
+                scheduler.release(priority)
+
+        if latency_stats is not None:
+            latency_stats.record(_endpoint_group(method, url), time.time() - started)
+        return http_body, http_status, http_headers, my_api_key
+
+    def interpret_response(self, http_body, http_status, http_headers=None):
         try:
             response = json.loads(http_body)
         except Exception:
-            raise Error("Invalid response body from API: (%d) %s " % (http_status, http_body), http_status, http_body)
+            raise _error_class(http_status)("Invalid response body from API: (%d) %s " % (http_status, http_body),
+                                            http_status, http_body, http_headers=http_headers)
         if not (200 <= http_status < 300):
-            self.handle_api_error(http_status, http_body, response)
+            self.handle_api_error(http_status, http_body, response, http_headers)
         return response
 
-    def requests_request(self, method, abs_url, headers, params):
+    def requests_request(self, method, abs_url, headers, params, request_timeout=None):
         method = method.lower()
         if method == 'get' or method == 'delete':
             if params:
@@ -346,18 +772,20 @@ class Requestor(object):
                 abs_url,
                 headers=headers,
                 data=data,
-                timeout=timeout,
+                timeout=request_timeout or timeout,
                 verify=True,
             )
             http_body = result.text
             http_status = result.status_code
+            http_headers = result.headers
         except Exception as e:
-            raise Error("Unexpected error communicating with EasyPost. If this "
-                        "problem persists please let us know at contact@easypost.com.",
-                        original_exception=e)
-        return http_body, http_status
+            error_class = RequestTimeoutError if isinstance(e, requests.exceptions.Timeout) else APIConnectionError
+            raise error_class("Unexpected error communicating with EasyPost. If this "
+                              "problem persists please let us know at contact@easypost.com.",
+                              original_exception=e)
+        return http_body, http_status, http_headers
 
-    def urlfetch_request(self, method, abs_url, headers, params):
+    def urlfetch_request(self, method, abs_url, headers, params, request_timeout=None):
         args = {}
         if method == 'post' or method == 'put':
             args['payload'] = self.encode(params)
@@ -371,27 +799,34 @@ class Requestor(object):
         args['method'] = method
         args['headers'] = headers
         args['validate_certificate'] = False
-        args['deadline'] = timeout
+        # urlfetch has a single deadline for the whole call
+        args['deadline'] = request_timeout[1] if request_timeout else timeout
 
         try:
             result = urlfetch.fetch(**args)
+        except urlfetch.DeadlineExceededError as e:
+            raise RequestTimeoutError("Timed out communicating with EasyPost. "
+                                      "If this problem persists, let us know at contact@easypost.com.",
+                                      original_exception=e)
         except Exception as e:
-            raise Error("Unexpected error communicating with EasyPost. "
-                        "If this problem persists, let us know at contact@easypost.com.",
-                        original_exception=e)
+            raise APIConnectionError("Unexpected error communicating with EasyPost. "
+                                     "If this problem persists, let us know at contact@easypost.com.",
+                                     original_exception=e)
 
-        return result.content, result.status_code
+        return result.content, result.status_code, result.headers
 
-    def handle_api_error(self, http_status, http_body, response):
+    def handle_api_error(self, http_status, http_body, response, http_headers=None):
+        error_class = _error_class(http_status)
         try:
             error = response['error']
         except (KeyError, TypeError):
-            raise Error("Invalid response from API: (%d) %r " % (http_status, http_body), http_status, http_body)
+            raise error_class("Invalid response from API: (%d) %r " % (http_status, http_body), http_status, http_body,
+                              http_headers=http_headers)
 
         try:
-            raise Error(error.get('message', ''), http_status, http_body)
+            raise error_class(error.get('message', ''), http_status, http_body, http_headers=http_headers)
         except AttributeError:
-            raise Error(error, http_status, http_body)
+            raise error_class(error, http_status, http_body, http_headers=http_headers)
 
 
 class EasyPostObject(object):
@@ -591,12 +1026,28 @@ class AllResource(Resource):
 
 
 class CreateResource(Resource):
+    # whether objects created with identical params may be reused through `created_object_cache`
+    _content_addressed = False
+
+    @classmethod
+    def _create_request(cls, requestor, url, wrapped_params, params):
+        if not cls._content_addressed or created_object_cache is None:
+            return requestor.request('post', url, wrapped_params)
+
+        my_api_key = requestor._api_key or api_key
+        params = Requestor._objects_to_ids(params)
+        response = created_object_cache.get(my_api_key, cls.class_name(), params)
+        if response is None:
+            response, my_api_key = requestor.request('post', url, wrapped_params)
+            created_object_cache.set(my_api_key, cls.class_name(), params, response)
+        return response, my_api_key
+
     @classmethod
     def create(cls, api_key=None, **params):
         requestor = Requestor(api_key)
         url = cls.class_url()
         wrapped_params = {cls.class_name(): params}
-        response, api_key = requestor.request('post', url, wrapped_params)
+        response, api_key = cls._create_request(requestor, url, wrapped_params, params)
         return convert_to_easypost_object(response, api_key)
 
 
@@ -628,11 +1079,40 @@ class DeleteResource(Resource):
 
 # specific resources
 class Address(AllResource, CreateResource):
+    _content_addressed = True
+
+    @classmethod
+    def _verification_request(cls, requestor, method, url, params, mode, fields):
+        if address_verification_cache is None:
+            return requestor.request(method, url, params)
+
+        my_api_key = requestor._api_key or api_key
+        key = address_verification_cache.key(my_api_key, mode, fields)
+        if key is None:
+            return requestor.request(method, url, params)
+        entry = address_verification_cache.get(key)
+        if entry is None:
+            try:
+                response, my_api_key = requestor.request(method, url, params)
+            except Error as e:
+                # remember addresses the API rejected, but not transient failures
+                if e.http_status is None or e.retryable:
+                    raise
+                entry = {'error': {'message': e.message, 'http_status': e.http_status, 'http_body': e.http_body}}
+            else:
+                entry = {'response': response}
+            address_verification_cache.set(key, entry)
+
+        if 'error' in entry:
+            error = entry['error']
+            raise _error_class(error['http_status'])(error['message'], error['http_status'], error['http_body'])
+        return entry['response'], my_api_key
 
     @classmethod
     def create(cls, api_key=None, verify=None, verify_strict=None, **params):
         requestor = Requestor(api_key)
         url = cls.class_url()
+        wrapped_params = {cls.class_name(): params}
 
         if verify or verify_strict:
             verify = verify or []
@@ -641,9 +1121,9 @@ class Address(AllResource, CreateResource):
                 ['verify[]={0}'.format(opt) for opt in verify] +
                 ['verify_strict[]={0}'.format(opt) for opt in verify_strict]
             )
-
-        wrapped_params = {cls.class_name(): params}
-        response, api_key = requestor.request('post', url, wrapped_params)
+            response, api_key = cls._verification_request(requestor, 'post', url, wrapped_params, url, params)
+        else:
+            response, api_key = cls._create_request(requestor, url, wrapped_params, params)
         return convert_to_easypost_object(response, api_key)
 
     @classmethod
@@ -655,7 +1135,8 @@ class Address(AllResource, CreateResource):
             cls.class_name(): params,
             "carrier": carrier
         }
-        response, api_key = requestor.request('post', url, wrapped_params)
+        mode = "%s?carrier=%s" % (url, carrier or '')
+        response, api_key = cls._verification_request(requestor, 'post', url, wrapped_params, mode, params)
 
         response_address = response.get('address', None)
         response_message = response.get('message', None)
@@ -674,7 +1155,8 @@ class Address(AllResource, CreateResource):
         url = "%s/%s" % (self.instance_url(), "verify")
         if carrier:
             url += "?carrier=%s" % carrier
-        response, api_key = requestor.request('get', url)
+        mode = "%s/verify?carrier=%s" % (self.class_url(), carrier or '')
+        response, api_key = self._verification_request(requestor, 'get', url, None, mode, self)
 
         response_address = response.get('address', None)
         response_message = response.get('message', None)
@@ -702,15 +1184,15 @@ class Insurance(AllResource, CreateResource):
 
 
 class CustomsItem(CreateResource):
-    pass
+    _content_addressed = True
 
 
 class CustomsInfo(CreateResource):
-    pass
+    _content_addressed = True
 
 
 class Parcel(CreateResource):
-    pass
+    _content_addressed = True
 
 
 class Shipment(AllResource, CreateResource):
@@ -728,26 +1210,26 @@ class Shipment(AllResource, CreateResource):
         self.refresh_from(response, api_key)
         return self
 
-    def buy(self, **params):
+    def buy(self, idempotency_key=None, **params):
         requestor = Requestor(self._api_key)
         url = "%s/%s" % (self.instance_url(), "buy")
-        response, api_key = requestor.request('post', url, params)
+        response, api_key = requestor.request('post', url, params, idempotency_key=_idempotency_key(idempotency_key))
         self.refresh_from(response, api_key)
         return self
 
-    def refund(self, **params):
+    def refund(self, idempotency_key=None, **params):
         requestor = Requestor(self._api_key)
         url = "%s/%s" % (self.instance_url(), "refund")
 
-        response, api_key = requestor.request('post', url, params)
+        response, api_key = requestor.request('post', url, params, idempotency_key=_idempotency_key(idempotency_key))
         self.refresh_from(response, api_key)
         return self
 
-    def insure(self, **params):
+    def insure(self, idempotency_key=None, **params):
         requestor = Requestor(self._api_key)
         url = "%s/%s" % (self.instance_url(), "insure")
 
-        response, api_key = requestor.request('post', url, params)
+        response, api_key = requestor.request('post', url, params, idempotency_key=_idempotency_key(idempotency_key))
         self.refresh_from(response, api_key)
         return self
 
@@ -764,6 +1246,7 @@ class Shipment(AllResource, CreateResource):
         services = services or []
 
         lowest_rate = None
+        lowest_amount = None
 
         try:
             carriers = carriers.split(',')
@@ -786,8 +1269,10 @@ class Shipment(AllResource, CreateResource):
             if len(services) > 0 and rate_service not in services:
                 continue
 
-            if lowest_rate is None or float(rate.rate) < float(lowest_rate.rate):
+            amount = float(rate.rate)
+            if lowest_amount is None or amount < lowest_amount:
                 lowest_rate = rate
+                lowest_amount = amount
 
         if lowest_rate is None:
             raise Error('No rates found.')
@@ -805,17 +1290,18 @@ class Refund(AllResource, CreateResource):
 
 class Batch(AllResource, CreateResource):
     @classmethod
-    def create_and_buy(cls, api_key=None, **params):
+    def create_and_buy(cls, api_key=None, idempotency_key=None, **params):
         requestor = Requestor(api_key)
         url = "%s/%s" % (cls.class_url(), "create_and_buy")
         wrapped_params = {cls.class_name(): params}
-        response, api_key = requestor.request('post', url, wrapped_params)
+        response, api_key = requestor.request(
+            'post', url, wrapped_params, idempotency_key=_idempotency_key(idempotency_key))
         return convert_to_easypost_object(response, api_key)
 
-    def buy(self, **params):
+    def buy(self, idempotency_key=None, **params):
         requestor = Requestor(self._api_key)
         url = "%s/%s" % (self.instance_url(), "buy")
-        response, api_key = requestor.request('post', url, params)
+        response, api_key = requestor.request('post', url, params, idempotency_key=_idempotency_key(idempotency_key))
         self.refresh_from(response, api_key)
         return self
 
@@ -847,6 +1333,17 @@ class Batch(AllResource, CreateResource):
         self.refresh_from(response, api_key)
         return self
 
+    def wait_until(self, states, timeout=None, initial_interval=1, max_interval=60):
+        waiter = BatchWaiter(states, initial_interval=initial_interval, max_interval=max_interval)
+        waiter.add(self)
+        finished = waiter.wait(timeout)
+        if self.id in waiter.failed:
+            raise waiter.failed[self.id]
+        if not finished:
+            raise Error('Timed out waiting for batch %s to reach %s; it is %s' % (
+                self.id, ', '.join(sorted(waiter.states)), self.state))
+        return self
+
 
 class PostageLabel(AllResource, CreateResource):
     pass
@@ -869,10 +1366,10 @@ class Tracker(AllResource, CreateResource):
 
 
 class Pickup(CreateResource):
-    def buy(self, **params):
+    def buy(self, idempotency_key=None, **params):
         requestor = Requestor(self._api_key)
         url = "%s/%s" % (self.instance_url(), "buy")
-        response, api_key = requestor.request('post', url, params)
+        response, api_key = requestor.request('post', url, params, idempotency_key=_idempotency_key(idempotency_key))
         self.refresh_from(response, api_key)
         return self
 
@@ -892,10 +1389,10 @@ class Order(CreateResource):
         self.refresh_from(response, api_key)
         return self
 
-    def buy(self, **params):
+    def buy(self, idempotency_key=None, **params):
         requestor = Requestor(self._api_key)
         url = "%s/%s" % (self.instance_url(), "buy")
-        response, api_key = requestor.request('post', url, params)
+        response, api_key = requestor.request('post', url, params, idempotency_key=_idempotency_key(idempotency_key))
         self.refresh_from(response, api_key)
         return self
 
@@ -906,15 +1403,28 @@ class PickupRate(Resource):
 
 class Event(AllResource, Resource):
     @classmethod
-    def receive(self, values):
-        return convert_to_easypost_object(json.loads(values), api_key)
+    def receive(cls, values, local_api_key=None):
+        if fast_json is not None:
+            response = fast_json.loads(values)
+        else:
+            if isinstance(values, six.binary_type):
+                values = values.decode('utf-8')
+            response = json.loads(values)
+        return convert_to_easypost_object(response, local_api_key or api_key)
 
 
 class CarrierAccount(AllResource, CreateResource, UpdateResource, DeleteResource):
+    @classmethod
+    def all(cls, api_key=None, **params):
+        requestor = Requestor(api_key)
+        url = cls.class_url()
+        response, api_key = requestor.request('get', url, params, cache=reference_cache)
+        return convert_to_easypost_object(response, api_key)
+
     @classmethod
     def types(cls, api_key=None):
         requestor = Requestor(api_key)
-        response, api_key = requestor.request('get', "/carrier_types")
+        response, api_key = requestor.request('get', "/carrier_types", cache=reference_cache)
         return convert_to_easypost_object(response, api_key)
 
 
@@ -934,24 +1444,23 @@ class User(CreateResource, UpdateResource, DeleteResource):
         except (KeyError, TypeError):
             pass
 
+        requestor = Requestor(api_key)
         if easypost_id == "":
-            requestor = Requestor(api_key)
-            response, api_key = requestor.request('get', cls.class_url())
-            return convert_to_easypost_object(response, api_key)
+            url = cls.class_url()
         else:
-            instance = cls(easypost_id, api_key, **params)
-            instance.refresh()
-            return instance
+            url = cls(easypost_id).instance_url()
+        response, api_key = requestor.request('get', url, params, cache=reference_cache)
+        return convert_to_easypost_object(response, api_key)
 
     @classmethod
     def all_api_keys(cls, api_key=None):
         requestor = Requestor(api_key)
         url = "/api_keys"
-        response, api_key = requestor.request('get', url)
+        response, api_key = requestor.request('get', url, cache=reference_cache)
         return convert_to_easypost_object(response, api_key)
 
     def api_keys(self):
-        api_keys = self.all_api_keys()
+        api_keys = self.all_api_keys(api_key=self._api_key)
 
         if api_keys.id == self.id:
             my_api_keys = api_keys.keys
@@ -980,6 +1489,22 @@ class Report(AllResource, CreateResource):
         response, api_key = requestor.request('get', url, params)
         return convert_to_easypost_object(response, api_key)
 
+    def wait_until(self, statuses=('available', 'failed'), timeout=None, initial_interval=1, max_interval=60):
+        waiter = Waiter(statuses, attribute='status', initial_interval=initial_interval, max_interval=max_interval)
+        waiter.add(self)
+        finished = waiter.wait(timeout)
+        if self.id in waiter.failed:
+            raise waiter.failed[self.id]
+        if not finished:
+            raise Error('Timed out waiting for report %s to reach %s; it is %s' % (
+                self.id, ', '.join(sorted(waiter.states)), self.status))
+        return self
+
+    def iter_rows(self):
+        if not self.get('url'):
+            raise Error('Report %s has no file to download; it is %s' % (self.id, self.get('status')))
+        return iter_csv_rows(self.url)
+
 
 class Blob(AllResource, CreateResource):
     @classmethod
@@ -1002,3 +1527,20 @@ class Webhook(AllResource, CreateResource, DeleteResource):
         response, api_key = requestor.request('put', url, params)
         self.refresh_from(response, api_key)
         return self
+
+
+from .rate_shopping import RateIndex, RateShopper  # noqa: E402,F401
+from .rate_table import RateTable  # noqa: E402,F401
+from .columnar import iter_nested, iter_payloads, to_arrow, to_columns  # noqa: E402,F401
+from .waiter import BatchWaiter, Waiter  # noqa: E402
+from .bulk import BulkPurchase  # noqa: E402,F401
+from .labels import LabelFetcher  # noqa: E402,F401
+from .reports import iter_csv_rows, stream_report  # noqa: E402,F401
+from .webhooks import EventIngestor, SignatureVerificationError, WebhookVerifier  # noqa: E402,F401
+from .trackers import TrackerStore  # noqa: E402,F401
+from .mirror import ShipmentMirror  # noqa: E402,F401
+from .outbox import Outbox  # noqa: E402,F401
+from .hedging import HedgePolicy  # noqa: E402,F401
+from .latency import LatencyHistogram, LatencyTracker  # noqa: E402,F401
+from .circuit import CircuitBreaker  # noqa: E402,F401
+from .scheduler import RequestScheduler  # noqa: E402,F401
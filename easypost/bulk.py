@@ -0,0 +1,121 @@
+import collections
+import hashlib
+import json
+import math
+import uuid
+from multiprocessing.pool import ThreadPool
+
+from . import Batch, BatchWaiter, Error, Requestor, request_options
+from .cache import _json_default
+
+
+BATCH_FINAL_STATES = ('purchased', 'purchase_failed', 'creation_failed')
+
+BulkPurchaseReport = collections.namedtuple('BulkPurchaseReport', ['results', 'errors', 'batches'])
+
+
+def shard(shipments, max_size):
+    # split into the fewest shards of at most `max_size`, as evenly sized as possible
+    if not shipments:
+        return []
+    count = int(math.ceil(len(shipments) / float(max_size)))
+    size, remainder = divmod(len(shipments), count)
+    shards = []
+    start = 0
+    for index in range(count):
+        end = start + size + (1 if index < remainder else 0)
+        shards.append(shipments[start:end])
+        start = end
+    return shards
+
+
+def shard_key(shipments):
+    payload = json.dumps(Requestor._objects_to_ids(shipments), sort_keys=True, default=_json_default)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _shipment_key(shipment, index):
+    # errors and results are reported by reference; shipments without one fall back to their id or position
+    return shipment.get('reference') or shipment.get('id') or '#%d' % index
+
+
+class BulkPurchase(object):
+    def __init__(self, api_key=None, max_batch_size=1000, concurrency=4, checkpoint=None,
+                 timeout=None, initial_interval=5, max_interval=60, run_id=None):
+        self.api_key = api_key
+        self.max_batch_size = max_batch_size
+        self.concurrency = concurrency
+        # any cache backend (e.g. `easypost.FileCache` or `easypost.SQLiteCache`) recording submitted batches
+        self.checkpoint = checkpoint
+        self.timeout = timeout
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        # scopes checkpoints and idempotency keys, so buying the same shipments again in a new run is not
+        # mistaken for a retry; pass the id of an interrupted run to resume it
+        self.run_id = run_id or uuid.uuid4().hex
+
+    def _submit(self, shipments):
+        key = '%s-%s' % (self.run_id, shard_key(shipments))
+        batch_id = self.checkpoint.get(key) if self.checkpoint is not None else None
+        if batch_id is not None:
+            # already bought by an earlier run; pick up where it left off instead of buying again
+            return Batch.retrieve(batch_id, api_key=self.api_key)
+
+        batch = Batch.create_and_buy(api_key=self.api_key, idempotency_key=key, shipment=shipments, reference=key)
+        if self.checkpoint is not None:
+            self.checkpoint.set(key, batch.id)
+        return batch
+
+    def run(self, shipments):
+        shipments = list(shipments)
+        shards = shard(shipments, self.max_batch_size)
+
+        def submit(shipments):
+            try:
+                with request_options(priority='bulk'):
+                    return self._submit(shipments), None
+            except Error as e:
+                return None, e
+
+        pool = ThreadPool(self.concurrency)
+        try:
+            submitted = pool.map(submit, shards)
+        finally:
+            pool.close()
+            pool.join()
+
+        waiter = BatchWaiter(BATCH_FINAL_STATES, initial_interval=self.initial_interval,
+                             max_interval=self.max_interval)
+        batches = []
+        for batch, _ in submitted:
+            if batch is not None:
+                batches.append(batch)
+                waiter.add(batch)
+        waiter.wait(self.timeout)
+
+        errors = {}
+        start = 0
+        for shard_shipments, (batch, error) in zip(shards, submitted):
+            if batch is not None and batch.id in waiter.failed:
+                error = waiter.failed[batch.id]
+            elif batch is not None and batch.id in waiter.pending:
+                error = Error('Timed out waiting for batch %s to finish' % batch.id)
+            if error is not None:
+                for index, shipment in enumerate(shard_shipments, start):
+                    errors[_shipment_key(shipment, index)] = error
+            start += len(shard_shipments)
+
+        return BulkPurchaseReport(self._merge(batches), errors, batches)
+
+    def _merge(self, batches):
+        results = {}
+        for batch in batches:
+            for shipment in batch.get('shipments') or []:
+                results[shipment.get('reference') or shipment.get('id')] = {
+                    'batch_id': batch.id,
+                    'shipment_id': shipment.get('id'),
+                    'status': shipment.get('batch_status'),
+                    'message': shipment.get('batch_message'),
+                    'tracking_code': shipment.get('tracking_code'),
+                }
+        return results
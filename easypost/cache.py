@@ -0,0 +1,349 @@
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import six
+
+
+def _key_url(key):
+    # request caches are keyed by (api key, url, encoded params)
+    if isinstance(key, (tuple, list)) and len(key) > 1 and isinstance(key[1], six.string_types):
+        return key[1]
+    return None
+
+
+def _under_url(cached_url, url):
+    return cached_url is not None and (
+        cached_url == url or cached_url.startswith(url + '/') or cached_url.startswith(url + '?'))
+
+
+class TTLCache(object):
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate(self, url):
+        # drop every cached response for `url` and anything nested below it, regardless of API key
+        with self._lock:
+            for key in list(self._entries):
+                if _under_url(_key_url(key), url):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+class LRUCache(object):
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and (entry[0] is None or entry[0] > time.time()):
+                # re-insert to mark the entry as most recently used
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires_at, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate(self, url):
+        with self._lock:
+            for key in list(self._entries):
+                if _under_url(_key_url(key), url):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+class FileCache(object):
+    def __init__(self, directory, ttl=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        digest = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            entry = None
+        if entry is not None and (entry['expires_at'] is None or entry['expires_at'] > time.time()):
+            self.hits += 1
+            return entry['value']
+        self.misses += 1
+        return None
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        entry = {
+            'expires_at': time.time() + ttl if ttl is not None else None,
+            'url': _key_url(key),
+            'value': value,
+        }
+        path = self._path(key)
+        # write to a temporary file first so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        _replace(tmp_path, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def invalidate(self, url):
+        # file names are hashes, so each entry records the url it was cached for
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path) as f:
+                    cached_url = json.load(f).get('url')
+                if _under_url(cached_url, url):
+                    os.remove(path)
+            except (IOError, OSError, ValueError):
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def stats(self):
+        size = len([name for name in os.listdir(self.directory) if name.endswith('.json')])
+        return {'hits': self.hits, 'misses': self.misses, 'size': size}
+
+
+class SQLiteCache(object):
+    def __init__(self, path, ttl=None):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, '
+                'url TEXT)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS cache_url ON cache (url)')
+
+    @staticmethod
+    def _key(key):
+        # keys hold API keys, which must not be written to disk as they are
+        return hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        key = self._key(key)
+        with self._lock:
+            row = self._conn.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is not None and (row[1] is None or row[1] > time.time()):
+                self.hits += 1
+                return json.loads(row[0])
+            if row is not None:
+                with self._conn:
+                    self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO cache (key, value, expires_at, url) VALUES (?, ?, ?, ?)',
+                               (self._key(key), json.dumps(value), expires_at, _key_url(key)))
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM cache WHERE key = ?', (self._key(key),))
+
+    def invalidate(self, url):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM cache WHERE url = ? OR substr(url, 1, ?) IN (?, ?)',
+                               (url, len(url) + 1, url + '/', url + '?'))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM cache')
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            return {'hits': self.hits, 'misses': self.misses, 'size': size}
+
+    def close(self):
+        self._conn.close()
+
+
+ADDRESS_FIELDS = (
+    'name', 'company', 'street1', 'street2', 'city', 'state', 'zip', 'country',
+    'phone', 'email', 'residential', 'carrier_facility', 'federal_tax_id', 'state_tax_id',
+)
+
+
+def normalize_address(fields):
+    normalized = []
+    for field in ADDRESS_FIELDS:
+        value = fields.get(field)
+        if value is None:
+            continue
+        # collapse whitespace and case so trivially different spellings share an entry
+        value = ' '.join(six.text_type(value).split()).upper()
+        if value:
+            normalized.append((field, value))
+    return tuple(normalized)
+
+
+class AddressVerificationCache(object):
+    def __init__(self, maxsize=10000, ttl=None, path=None):
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.store = SQLiteCache(path, ttl=ttl) if path is not None else None
+
+    def key(self, api_key, mode, fields):
+        # None when there is nothing to tell the address apart by, e.g. an Address holding only an id that
+        # was never retrieved and is not worth caching on its fields alone
+        address_id = fields.get('id')
+        normalized = normalize_address(fields)
+        if address_id is None and not normalized:
+            return None
+        return (api_key, mode, address_id, normalized)
+
+    def get(self, key):
+        entry = self.memory.get(key)
+        if entry is None and self.store is not None:
+            entry = self.store.get(key)
+            if entry is not None:
+                self.memory.set(key, entry)
+        return entry
+
+    def set(self, key, entry):
+        self.memory.set(key, entry)
+        if self.store is not None:
+            self.store.set(key, entry)
+
+    def clear(self):
+        self.memory.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self):
+        stats = {'memory': self.memory.stats()}
+        if self.store is not None:
+            stats['store'] = self.store.stats()
+        return stats
+
+
+class CreatedObjectCache(object):
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else LRUCache(maxsize=10000)
+
+    def key(self, api_key, class_name, params):
+        payload = json.dumps(params, sort_keys=True, default=_json_default)
+        return (api_key, class_name, hashlib.sha1(payload.encode('utf-8')).hexdigest())
+
+    def get(self, api_key, class_name, params):
+        return self.backend.get(self.key(api_key, class_name, params))
+
+    def set(self, api_key, class_name, params, response):
+        self.backend.set(self.key(api_key, class_name, params), response)
+
+    def created_id(self, api_key, class_name, params):
+        response = self.get(api_key, class_name, params)
+        if response is None:
+            return None
+        return response.get('id')
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return self.backend.stats()
+
+
+def _json_default(value):
+    if isinstance(value, six.binary_type):
+        return value.decode('utf-8')
+    return six.text_type(value)
+
+
+def _replace(src, dst):
+    try:
+        os.replace(src, dst)
+    except AttributeError:
+        # python 2 has no os.replace; rename is atomic on POSIX
+        os.rename(src, dst)
@@ -0,0 +1,106 @@
+import collections
+import threading
+import time
+
+from . import CircuitOpenError
+
+
+class _Circuit(object):
+    def __init__(self):
+        self.state = 'closed'
+        self.outcomes = collections.deque()
+        self.opened_at = None
+        self.probes = 0
+        # bumped on every state change, so outcomes of requests let through earlier can be told apart
+        self.generation = 0
+
+
+class CircuitBreaker(object):
+    def __init__(self, failure_threshold=0.5, min_requests=20, window=60, reset_timeout=30, half_open_requests=1):
+        # opens once at least `min_requests` were sent to an endpoint group within `window` seconds and
+        # `failure_threshold` of them failed; after `reset_timeout` seconds, `half_open_requests` probes
+        # decide whether it closes again
+        self.failure_threshold = failure_threshold
+        self.min_requests = min_requests
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.half_open_requests = half_open_requests
+        self._circuits = collections.defaultdict(_Circuit)
+        self._lock = threading.Lock()
+
+    def _trim(self, circuit, now):
+        while circuit.outcomes and circuit.outcomes[0][0] <= now - self.window:
+            circuit.outcomes.popleft()
+
+    def _set_state(self, circuit, state, now):
+        circuit.state = state
+        circuit.generation += 1
+        if state == 'open':
+            circuit.opened_at = now
+        elif state == 'half_open':
+            circuit.probes = 0
+        else:
+            circuit.outcomes.clear()
+
+    def before(self, api_key, group):
+        # raises CircuitOpenError instead of letting a request through to a failing endpoint group; returns
+        # the token to pass to `record` with the request's outcome
+        now = time.time()
+        with self._lock:
+            circuit = self._circuits[(api_key, group)]
+            if circuit.state == 'open' and now - circuit.opened_at >= self.reset_timeout:
+                self._set_state(circuit, 'half_open', now)
+            if circuit.state == 'closed':
+                return (circuit.generation, False)
+            if circuit.state == 'half_open' and circuit.probes < self.half_open_requests:
+                circuit.probes += 1
+                return (circuit.generation, True)
+            retry_after = max(self.reset_timeout - (now - circuit.opened_at), 0)
+        raise CircuitOpenError('Circuit open for %s; failing fast for another %ds' % (group, retry_after),
+                               retry_after=retry_after)
+
+    def record(self, api_key, group, failed, token):
+        # `failed` is None for requests that were never sent, which only frees their probe slot. outcomes of
+        # requests let through before the last state change are ignored: a request started while the circuit
+        # was closed neither decides a half-open circuit nor takes a probe's slot
+        now = time.time()
+        with self._lock:
+            circuit = self._circuits[(api_key, group)]
+            generation, probe = token
+            if generation != circuit.generation:
+                return
+            if circuit.state == 'half_open':
+                if not probe:
+                    return
+                circuit.probes = max(circuit.probes - 1, 0)
+                if failed is not None:
+                    self._set_state(circuit, 'open' if failed else 'closed', now)
+                return
+            if failed is None or circuit.state == 'open':
+                return
+
+            circuit.outcomes.append((now, failed))
+            self._trim(circuit, now)
+            failures = sum(1 for _, outcome in circuit.outcomes if outcome)
+            if (len(circuit.outcomes) >= self.min_requests and
+                    failures >= self.failure_threshold * len(circuit.outcomes)):
+                self._set_state(circuit, 'open', now)
+
+    def states(self):
+        # keyed by (masked API key, endpoint group), e.g. for a dashboard
+        now = time.time()
+        with self._lock:
+            states = {}
+            for (api_key, group), circuit in self._circuits.items():
+                self._trim(circuit, now)
+                states[('...' + (api_key or '')[-4:], group)] = {
+                    'state': circuit.state,
+                    'requests': len(circuit.outcomes),
+                    'failures': sum(1 for _, outcome in circuit.outcomes if outcome),
+                    'opened_at': circuit.opened_at,
+                }
+            return states
+
+    def reset(self):
+        with self._lock:
+            self._circuits.clear()
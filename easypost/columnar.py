@@ -0,0 +1,73 @@
+import collections
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from . import Report, Requestor
+
+
+def _lookup(record, path):
+    value = record
+    for part in path:
+        if value is None:
+            return None
+        if isinstance(value, list):
+            try:
+                value = value[int(part)]
+            except (ValueError, IndexError):
+                return None
+        else:
+            value = value.get(part)
+    return value
+
+
+def to_columns(records, fields):
+    # `records` may be EasyPostObjects or raw API payloads; `fields` are dotted paths such as
+    # "to_address.zip" or "rates.0.rate"
+    paths = [(field, field.split('.')) for field in fields]
+    columns = collections.OrderedDict((field, []) for field in fields)
+    for record in records:
+        for field, path in paths:
+            columns[field].append(_lookup(record, path))
+    return columns
+
+
+def to_arrow(records, fields):
+    if pyarrow is None:
+        raise ImportError('to_arrow requires pyarrow. Install it via "pip install pyarrow".')
+    columns = to_columns(records, fields)
+    return pyarrow.table(collections.OrderedDict((field, pyarrow.array(values)) for field, values in columns.items()))
+
+
+def iter_nested(records, field, parent_fields=None):
+    # yield nested payloads (e.g. each rate of each shipment) with selected parent fields copied in,
+    # such as `iter_nested(shipments, 'rates', {'shipment_reference': 'reference'})`
+    parent_paths = [(name, path.split('.')) for name, path in (parent_fields or {}).items()]
+    for record in records:
+        parents = [(name, _lookup(record, path)) for name, path in parent_paths]
+        for item in _lookup(record, field.split('.')) or []:
+            if parents:
+                item = dict(item.to_dict() if hasattr(item, 'to_dict') else item)
+                item.update(parents)
+            yield item
+
+
+def iter_payloads(cls, api_key=None, **params):
+    # page through a list endpoint yielding raw payloads without building EasyPostObjects
+    requestor = Requestor(api_key)
+    url = cls.class_url()
+    if issubclass(cls, Report):
+        url = "%s/%s" % (url, params['type'])
+    key = cls.class_url().lstrip('/')
+
+    params = dict(params)
+    while True:
+        response, _ = requestor.request('get', url, params)
+        page = response.get(key) or []
+        for payload in page:
+            yield payload
+        if not page or not response.get('has_more'):
+            break
+        params['before_id'] = page[-1]['id']
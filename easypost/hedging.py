@@ -0,0 +1,91 @@
+import collections
+import threading
+import time
+
+from six.moves import queue
+
+from . import RequestTimeoutError
+from .latency import LatencyTracker
+
+
+class HedgePolicy(object):
+    def __init__(self, delay=None, percentile=95, max_extra_load=0.05, min_samples=50, window=1000):
+        # hedge after a fixed `delay` in seconds, or else after the given percentile of the endpoint
+        # group's recent latencies
+        self.delay = delay
+        self.percentile = percentile
+        self.max_extra_load = max_extra_load
+        self.stats = collections.Counter()
+        self.latencies = LatencyTracker(min_samples=min_samples, decay_every=window)
+        self._lock = threading.Lock()
+
+    def record(self, group, latency):
+        self.latencies.record(group, latency)
+
+    def delay_for(self, group):
+        if self.delay is not None:
+            return self.delay
+        return self.latencies.percentile(group, self.percentile)
+
+    def _acquire(self):
+        # keep hedged requests within `max_extra_load` of all calls
+        with self._lock:
+            if self.stats['hedged'] + 1 > self.max_extra_load * self.stats['calls']:
+                self.stats['over_budget'] += 1
+                return False
+            self.stats['hedged'] += 1
+            return True
+
+    def _start(self, func, group, index, results):
+        def run():
+            started = time.time()
+            try:
+                result = func()
+            except Exception as e:
+                if isinstance(e, RequestTimeoutError) and e.retryable:
+                    # slow enough to time out is still a latency sample; a deadline that ran out before
+                    # sending is not
+                    self.record(group, time.time() - started)
+                results.put((index, None, e))
+                return
+            self.record(group, time.time() - started)
+            results.put((index, result, None))
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def call(self, func, group=None):
+        # returns the first successful result of `func`, sending a second attempt if the first is slow;
+        # raises the first error only when every attempt failed
+        with self._lock:
+            self.stats['calls'] += 1
+        results = queue.Queue()
+        self._start(func, group, 0, results)
+        launched = 1
+
+        outcome = None
+        delay = self.delay_for(group)
+        if delay is not None:
+            try:
+                outcome = results.get(timeout=delay)
+            except queue.Empty:
+                if self._acquire():
+                    self._start(func, group, 1, results)
+                    launched = 2
+
+        error = None
+        received = 0
+        while True:
+            index, result, e = outcome if outcome is not None else results.get()
+            outcome = None
+            received += 1
+            if e is None:
+                if index == 1:
+                    with self._lock:
+                        self.stats['hedge_wins'] += 1
+                return result
+            if error is None:
+                error = e
+            if received == launched:
+                raise error
@@ -0,0 +1,227 @@
+import collections
+import io
+import itertools
+import os
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+from . import APIConnectionError, Batch, Error, _error_class
+from .cache import _replace
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+
+LABEL_URL_FIELDS = {
+    'pdf': 'label_pdf_url',
+    'zpl': 'label_zpl_url',
+    'epl2': 'label_epl2_url',
+    'png': 'label_url',
+}
+
+
+def label_url(shipment, file_format=None):
+    # request the format variant first if the shipment does not have it yet
+    field = LABEL_URL_FIELDS.get(file_format.lower(), 'label_url') if file_format else 'label_url'
+    postage_label = shipment.get('postage_label')
+    if postage_label is None and not file_format:
+        # shipments listed on a batch only carry their id and status
+        shipment.refresh()
+        postage_label = shipment.get('postage_label')
+    url = postage_label.get(field) if postage_label is not None else None
+    if not url and file_format:
+        shipment.label(file_format=file_format)
+        url = shipment.postage_label.get(field)
+    if not url:
+        raise Error('Shipment %s has no %s label' % (shipment.get('id'), file_format or 'purchased'))
+    return url
+
+
+def _merge_format(file_format):
+    file_format = file_format.lower()
+    if file_format not in ('zpl', 'pdf'):
+        raise Error('Labels can only be merged as zpl or pdf, not %s' % file_format)
+    return file_format
+
+
+class LabelFetcher(object):
+    def __init__(self, concurrency=8, chunk_size=64 * 1024, timeout=60, session=None):
+        if session is None:
+            if requests is None:
+                raise ImportError('LabelFetcher requires requests. Install it via "pip install requests".')
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=concurrency, pool_maxsize=concurrency, max_retries=3)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+    def iter_chunks(self, url):
+        try:
+            response = self.session.get(url, stream=True, timeout=self.timeout)
+        except Exception as e:
+            raise APIConnectionError('Unable to download label %s' % url, original_exception=e)
+        try:
+            if response.status_code != 200:
+                raise _error_class(response.status_code)(
+                    'Unable to download label %s: HTTP %d' % (url, response.status_code),
+                    http_status=response.status_code, http_headers=response.headers)
+            expected = response.headers.get('Content-Length')
+            received = 0
+            chunks = response.iter_content(self.chunk_size)
+            while True:
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    raise APIConnectionError('Unable to download label %s' % url, original_exception=e)
+                received += len(chunk)
+                yield chunk
+            # Content-Length counts the bytes on the wire, before any Content-Encoding is decoded
+            tell = getattr(response.raw, 'tell', None)
+            if tell is not None:
+                received = tell()
+            elif response.headers.get('Content-Encoding'):
+                expected = None
+            if expected is not None and int(expected) != received:
+                raise APIConnectionError('Incomplete label download %s: expected %s bytes, received %d' % (
+                    url, expected, received))
+        finally:
+            response.close()
+
+    def fetch(self, url, sink):
+        # stream into a file-like `sink`, or a path written atomically once the download is complete
+        if hasattr(sink, 'write'):
+            size = 0
+            for chunk in self.iter_chunks(url):
+                sink.write(chunk)
+                size += len(chunk)
+            return size
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(sink)), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                size = self.fetch(url, f)
+            _replace(tmp_path, sink)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return size
+
+    def _map(self, func, items):
+        def call(item):
+            try:
+                return func(item)
+            except Error as e:
+                return e
+
+        pool = ThreadPool(self.concurrency)
+        try:
+            return pool.map(call, items)
+        finally:
+            pool.close()
+            pool.join()
+
+    def fetch_all(self, downloads):
+        # `downloads` is a list of (url, sink) pairs; returns the byte count or Error for each
+        return self._map(lambda download: self.fetch(*download), downloads)
+
+    def download(self, shipments, directory, file_format=None):
+        # returns the written path, or the Error, for each shipment id
+        def download(shipment):
+            url = label_url(shipment, file_format)
+            extension = file_format or os.path.splitext(url.split('?')[0])[1].lstrip('.') or 'label'
+            path = os.path.join(directory, '%s.%s' % (shipment.id, extension.lower()))
+            self.fetch(url, path)
+            return path
+
+        shipments = list(shipments)
+        return dict(zip([shipment.id for shipment in shipments], self._map(download, shipments)))
+
+    def iter_labels(self, shipments, file_format=None, prefetch=8):
+        # yield each shipment's label bytes in order while fetching up to `prefetch` labels ahead
+        def fetch(shipment):
+            sink = io.BytesIO()
+            self.fetch(label_url(shipment, file_format), sink)
+            return sink.getvalue()
+
+        pool = ThreadPool(min(self.concurrency, prefetch))
+        try:
+            window = collections.deque()
+            for shipment in shipments:
+                window.append(pool.apply_async(fetch, (shipment,)))
+                if len(window) >= prefetch:
+                    yield window.popleft().get()
+            while window:
+                yield window.popleft().get()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _write_labels(self, labels, sink, file_format):
+        count = 0
+        if file_format == 'zpl':
+            for label in labels:
+                if not label.endswith(b'\n'):
+                    label += b'\n'
+                sink.write(label)
+                count += 1
+            return count
+
+        if pypdf is None:
+            raise ImportError('Merging PDF labels requires pypdf. Install it via "pip install pypdf".')
+        # pypdf keeps every page in memory until the file is written; use merge_files for large sets
+        writer = pypdf.PdfWriter()
+        for label in labels:
+            for page in pypdf.PdfReader(io.BytesIO(label)).pages:
+                writer.add_page(page)
+            count += 1
+        writer.write(sink)
+        return count
+
+    def merge(self, source, sink, file_format='zpl', prefetch=8):
+        # concatenate the labels of a Batch or list of shipments into one ZPL stream or multi-page PDF;
+        # returns how many labels were merged, or None when the batch's own merged label file was used
+        file_format = _merge_format(file_format)
+        if isinstance(source, Batch):
+            batch_label_url = source.get('label_url')
+            if batch_label_url and batch_label_url.split('?')[0].lower().endswith('.' + file_format):
+                # the API already merged this batch's labels into one file
+                self.fetch(batch_label_url, sink)
+                return None
+            source = source.get('shipments') or []
+        return self._write_labels(self.iter_labels(source, file_format, prefetch), sink, file_format)
+
+    def merge_files(self, source, path_template, file_format='pdf', labels_per_file=500, prefetch=8):
+        # like merge, but starts a new file named `path_template % part` (counting from 1) every
+        # `labels_per_file` labels, so no more than that many are held in memory; returns the paths written
+        file_format = _merge_format(file_format)
+        if isinstance(source, Batch):
+            source = source.get('shipments') or []
+        labels = self.iter_labels(source, file_format, prefetch)
+        paths = []
+        while True:
+            part = list(itertools.islice(labels, labels_per_file))
+            if not part:
+                return paths
+            path = path_template % (len(paths) + 1)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.part')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    self._write_labels(part, f, file_format)
+                _replace(tmp_path, path)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+            paths.append(path)
@@ -0,0 +1,78 @@
+import bisect
+import collections
+import threading
+
+
+# bucket upper bounds growing by 10% from 1ms to about 10 minutes
+LATENCY_BUCKETS = [0.001 * 1.1 ** i for i in range(140)]
+
+
+class LatencyHistogram(object):
+    def __init__(self, decay_every=1000):
+        # halving every count each `decay_every` samples lets the histogram follow shifting latencies
+        self.decay_every = decay_every
+        self.counts = [0.0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.samples = 0
+
+    def record(self, latency):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.total += 1
+        self.samples += 1
+        if self.decay_every and self.samples % self.decay_every == 0:
+            self.counts = [count / 2 for count in self.counts]
+            self.total /= 2
+
+    def percentile(self, p):
+        if not self.total:
+            return None
+        target = p / 100.0 * self.total
+        seen = 0.0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return LATENCY_BUCKETS[min(index, len(LATENCY_BUCKETS) - 1)]
+        return LATENCY_BUCKETS[-1]
+
+
+class LatencyTracker(object):
+    def __init__(self, min_samples=100, decay_every=1000, timeout_percentile=99.9, timeout_factor=2,
+                 min_timeout=1, max_timeout=None):
+        self.min_samples = min_samples
+        self.decay_every = decay_every
+        self.timeout_percentile = timeout_percentile
+        self.timeout_factor = timeout_factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._histograms = collections.defaultdict(lambda: LatencyHistogram(self.decay_every))
+        self._lock = threading.Lock()
+
+    def record(self, group, latency):
+        with self._lock:
+            self._histograms[group].record(latency)
+
+    def percentile(self, group, p):
+        # None until the endpoint group has seen `min_samples` requests
+        with self._lock:
+            histogram = self._histograms.get(group)
+            if histogram is None or histogram.samples < self.min_samples:
+                return None
+            return histogram.percentile(p)
+
+    def timeout_for(self, group):
+        latency = self.percentile(group, self.timeout_percentile)
+        if latency is None:
+            return None
+        timeout = max(latency * self.timeout_factor, self.min_timeout)
+        if self.max_timeout is not None:
+            timeout = min(timeout, self.max_timeout)
+        return timeout
+
+    def snapshot(self):
+        with self._lock:
+            return dict((group, {
+                'count': histogram.samples,
+                'p50': histogram.percentile(50),
+                'p99': histogram.percentile(99),
+                'p99.9': histogram.percentile(99.9),
+            }) for group, histogram in self._histograms.items())
@@ -0,0 +1,174 @@
+import json
+import sqlite3
+import threading
+
+from . import Requestor, Shipment, convert_to_easypost_object, request_options
+from .trackers import TRACKER_EVENTS
+
+
+SHIPMENT_COLUMNS = ('reference', 'tracking_code', 'status', 'created_at', 'updated_at', 'recipient')
+
+
+def _recipient(payload):
+    to_address = payload.get('to_address') or {}
+    name = to_address.get('name') or to_address.get('company')
+    return name.lower() if name else None
+
+
+def _row(payload):
+    return (
+        payload['id'], payload.get('reference'), payload.get('tracking_code'), payload.get('status'),
+        payload.get('created_at'), payload.get('updated_at'), _recipient(payload), json.dumps(payload),
+    )
+
+
+class ShipmentMirror(object):
+    def __init__(self, path, api_key=None):
+        self.path = path
+        self.api_key = api_key
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS shipments (id TEXT PRIMARY KEY, reference TEXT, tracking_code TEXT, '
+                'status TEXT, created_at TEXT, updated_at TEXT, recipient TEXT, payload TEXT NOT NULL)')
+            for column in ('reference', 'tracking_code', 'status', 'created_at', 'recipient'):
+                self._conn.execute(
+                    'CREATE INDEX IF NOT EXISTS shipments_%s ON shipments (%s)' % (column, column))
+            self._conn.execute('CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM shipments').fetchone()[0]
+
+    def upsert(self, shipments):
+        # store shipment payloads (or Shipment objects), replacing older copies by id
+        rows = [_row(shipment.to_dict() if hasattr(shipment, 'to_dict') else shipment) for shipment in shipments]
+        with self._lock, self._conn:
+            self._replace(rows)
+        return len(rows)
+
+    def _replace(self, rows):
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO shipments (id, %s, payload) VALUES (?, ?, ?, ?, ?, ?, ?, ?)' % (
+                ', '.join(SHIPMENT_COLUMNS)), rows)
+
+    def handle_event(self, event):
+        # usable directly as an `EventIngestor` handler. sync only pages shipments created after the newest
+        # mirrored one, so tracker events are what keep the tracking code and status of older rows current
+        if event.get('description') not in TRACKER_EVENTS or event.get('result') is None:
+            return False
+        tracker = event.result.to_dict() if hasattr(event.result, 'to_dict') else dict(event.result)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                'SELECT payload FROM shipments WHERE id = ?', (tracker.get('shipment_id'),)).fetchone()
+            if row is None:
+                return False
+            payload = json.loads(row[0])
+            current = payload.get('tracker') or {}
+            if (tracker.get('updated_at') or '') >= (current.get('updated_at') or ''):
+                # out-of-order deliveries never roll the shipment back
+                payload['tracker'] = tracker
+                payload['tracking_code'] = tracker.get('tracking_code') or payload.get('tracking_code')
+                payload['status'] = tracker.get('status') or payload.get('status')
+                self._replace([_row(payload)])
+        return True
+
+    def newest_created_at(self):
+        with self._lock:
+            return self._conn.execute('SELECT MAX(created_at) FROM shipments').fetchone()[0]
+
+    def _state(self, name):
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM sync_state WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def _set_state(self, name, value):
+        if value is None:
+            self._conn.execute('DELETE FROM sync_state WHERE name = ?', (name,))
+        else:
+            self._conn.execute('INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)',
+                               (name, json.dumps(value)))
+
+    def sync(self, page_size=100, **params):
+        # page newest-first through the shipments created since the last completed sync; returns how many
+        # were stored. pass `start_datetime` to bound the first sync of a large account. an interrupted sync
+        # is resumed where it stopped, and `synced_until` only advances once a sync has paged through
+        cursor = self._state('cursor')
+        if cursor is None:
+            cursor = {'start_datetime': self._state('synced_until'), 'before_id': None, 'newest': None}
+        if cursor['start_datetime'] is not None:
+            params.setdefault('start_datetime', cursor['start_datetime'])
+        cursor['start_datetime'] = params.get('start_datetime')
+        if cursor['before_id'] is not None:
+            params['before_id'] = cursor['before_id']
+        params['page_size'] = page_size
+
+        requestor = Requestor(self.api_key)
+        count = 0
+        while True:
+            with request_options(priority='bulk'):
+                response, _ = requestor.request('get', Shipment.class_url(), params)
+            page = response.get('shipments') or []
+            for payload in page:
+                created_at = payload.get('created_at')
+                if created_at and (cursor['newest'] is None or created_at > cursor['newest']):
+                    cursor['newest'] = created_at
+            done = not page or not response.get('has_more')
+            if not done:
+                cursor['before_id'] = params['before_id'] = page[-1]['id']
+            with self._lock, self._conn:
+                # the page and the cursor pointing past it are stored together
+                self._replace([_row(payload) for payload in page])
+                self._set_state('cursor', None if done else cursor)
+                if done and cursor['newest'] is not None:
+                    self._set_state('synced_until', cursor['newest'])
+            count += len(page)
+            if done:
+                return count
+
+    @property
+    def synced_until(self):
+        return self._state('synced_until')
+
+    def _build(self, payload):
+        return convert_to_easypost_object(json.loads(payload), self.api_key)
+
+    def get(self, shipment_id):
+        with self._lock:
+            row = self._conn.execute('SELECT payload FROM shipments WHERE id = ?', (shipment_id,)).fetchone()
+        return self._build(row[0]) if row is not None else None
+
+    def find(self, reference=None, tracking_code=None, status=None, recipient=None, created_after=None,
+             created_before=None, limit=None):
+        # yields Shipments newest first, decoding each stored payload only when it is reached
+        clauses = []
+        values = []
+        for column, value in (('reference', reference), ('tracking_code', tracking_code), ('status', status)):
+            if value is not None:
+                clauses.append('%s = ?' % column)
+                values.append(value)
+        if recipient is not None:
+            clauses.append('recipient LIKE ?')
+            values.append('%' + recipient.lower() + '%')
+        if created_after is not None:
+            clauses.append('created_at >= ?')
+            values.append(created_after)
+        if created_before is not None:
+            clauses.append('created_at < ?')
+            values.append(created_before)
+
+        query = 'SELECT payload FROM shipments'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY created_at DESC'
+        if limit is not None:
+            query += ' LIMIT %d' % limit
+
+        with self._lock:
+            rows = self._conn.execute(query, values).fetchall()
+        for row in rows:
+            yield self._build(row[0])
+
+    def close(self):
+        self._conn.close()
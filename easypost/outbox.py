@@ -0,0 +1,160 @@
+import collections
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from multiprocessing.pool import ThreadPool
+
+import six
+
+from . import Error, Pickup, Requestor, Shipment, convert_to_easypost_object
+from .cache import _json_default
+
+
+def _shipment_bought(shipment):
+    return shipment.get('postage_label') is not None
+
+
+def _shipment_insured(shipment):
+    return shipment.get('insurance') is not None
+
+
+def _pickup_bought(pickup):
+    return pickup.get('status') == 'scheduled'
+
+
+# operation name: (resource class, method, check telling whether an earlier attempt already went through)
+OUTBOX_OPERATIONS = {
+    'shipment.buy': (Shipment, 'buy', _shipment_bought),
+    'shipment.insure': (Shipment, 'insure', _shipment_insured),
+    'pickup.buy': (Pickup, 'buy', _pickup_bought),
+}
+
+OutboxJob = collections.namedtuple(
+    'OutboxJob', ['idempotency_key', 'operation', 'object_id', 'state', 'attempts', 'result', 'error'])
+
+
+class Outbox(object):
+    def __init__(self, path, api_key=None, concurrency=4, max_attempts=5, retry_interval=5, lease_timeout=300):
+        self.path = path
+        self.api_key = api_key
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_interval = retry_interval
+        # a running operation not finished within `lease_timeout` seconds is assumed lost with its process
+        # and claimed again; it is checked against the API before being attempted again
+        self.lease_timeout = lease_timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS outbox (seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'idempotency_key TEXT NOT NULL UNIQUE, operation TEXT NOT NULL, object_id TEXT NOT NULL, '
+                'params TEXT NOT NULL, state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, '
+                'next_attempt_at REAL NOT NULL, result TEXT, error TEXT)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS outbox_state ON outbox (state, next_attempt_at)')
+
+    def enqueue(self, operation, obj, idempotency_key=None, **params):
+        # enqueuing the same idempotency key twice records the operation only once
+        if operation not in OUTBOX_OPERATIONS:
+            raise Error('Unsupported outbox operation %s' % operation)
+        object_id = obj if isinstance(obj, six.string_types) else obj['id']
+        if idempotency_key is None:
+            idempotency_key = uuid.uuid4().hex
+        params = json.dumps(Requestor._objects_to_ids(params), default=_json_default)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR IGNORE INTO outbox (idempotency_key, operation, object_id, params, state, next_attempt_at) '
+                "VALUES (?, ?, ?, ?, 'pending', ?)", (idempotency_key, operation, object_id, params, time.time()))
+        return idempotency_key
+
+    def _claim(self):
+        # several processes may share the outbox, so a job only counts as claimed once the update that
+        # marks it running matched it unchanged; for running jobs, next_attempt_at is the lease expiry
+        while True:
+            now = time.time()
+            with self._lock, self._conn:
+                rows = self._conn.execute(
+                    "SELECT idempotency_key, operation, object_id, params, attempts, state FROM outbox "
+                    "WHERE state IN ('pending', 'running') AND next_attempt_at <= ? ORDER BY seq LIMIT ?",
+                    (now, self.concurrency)).fetchall()
+                if not rows:
+                    return None
+                for row in rows:
+                    claimed = self._conn.execute(
+                        "UPDATE outbox SET state = 'running', attempts = attempts + 1, next_attempt_at = ? "
+                        "WHERE idempotency_key = ? AND state = ? AND attempts = ? AND next_attempt_at <= ?",
+                        (now + self.lease_timeout, row[0], row[5], row[4], now)).rowcount
+                    if claimed:
+                        return row[:5]
+
+    def _finish(self, key, attempts, state, result=None, error=None, next_attempt_at=None):
+        # a worker whose lease ran out leaves the job to whoever claimed it since
+        with self._lock, self._conn:
+            self._conn.execute(
+                'UPDATE outbox SET state = ?, result = ?, error = ?, next_attempt_at = COALESCE(?, next_attempt_at) '
+                "WHERE idempotency_key = ? AND attempts = ? AND state = 'running'",
+                (state, result, error, next_attempt_at, key, attempts + 1))
+
+    def _execute(self, key, operation, object_id, params, attempts):
+        cls, method, already_done = OUTBOX_OPERATIONS[operation]
+        try:
+            if attempts:
+                # an earlier attempt may have gone through before its response was lost
+                obj = cls.retrieve(object_id, api_key=self.api_key)
+                if already_done(obj):
+                    self._finish(key, attempts, 'done', json.dumps(obj.to_dict(), default=_json_default))
+                    return 'done'
+            else:
+                obj = cls(object_id, self.api_key)
+            getattr(obj, method)(idempotency_key=key, **json.loads(params))
+        except Error as e:
+            if e.retryable and attempts + 1 < self.max_attempts:
+                self._finish(key, attempts, 'pending', error=e.message,
+                             next_attempt_at=time.time() + self.retry_interval * 2 ** attempts)
+                return 'retrying'
+            self._finish(key, attempts, 'failed', error=e.message)
+            return 'failed'
+        except Exception as e:
+            # not an API error, so retrying would most likely fail the same way
+            self._finish(key, attempts, 'failed', error='%s: %s' % (type(e).__name__, e))
+            return 'failed'
+        self._finish(key, attempts, 'done', json.dumps(obj.to_dict(), default=_json_default))
+        return 'done'
+
+    def run(self):
+        # execute every due operation with `concurrency` workers; returns how many ended in each state.
+        # operations waiting to be retried later stay queued for the next run
+        def work(_):
+            counts = collections.Counter()
+            while True:
+                job = self._claim()
+                if job is None:
+                    return counts
+                counts[self._execute(*job)] += 1
+
+        pool = ThreadPool(self.concurrency)
+        try:
+            results = pool.map(work, range(self.concurrency))
+        finally:
+            pool.close()
+            pool.join()
+        return dict(sum(results, collections.Counter()))
+
+    def job(self, idempotency_key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT idempotency_key, operation, object_id, state, attempts, result, error FROM outbox '
+                'WHERE idempotency_key = ?', (idempotency_key,)).fetchone()
+        if row is None:
+            return None
+        result = convert_to_easypost_object(json.loads(row[5]), self.api_key) if row[5] else None
+        return OutboxJob(row[0], row[1], row[2], row[3], row[4], result, row[6])
+
+    def counts(self):
+        with self._lock:
+            return dict(self._conn.execute('SELECT state, COUNT(*) FROM outbox GROUP BY state').fetchall())
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,133 @@
+import collections
+import datetime
+import decimal
+from multiprocessing.pool import ThreadPool
+
+import six
+
+from . import Error, Shipment
+
+
+IndexedRate = collections.namedtuple(
+    'IndexedRate', ['rate', 'amount', 'carrier', 'service', 'delivery_days', 'delivery_date'])
+RateChoice = collections.namedtuple('RateChoice', ['shipment', 'rate', 'error'])
+
+
+def _normalize_filter(values):
+    if not values:
+        return None
+    if isinstance(values, six.string_types):
+        values = values.split(',')
+    return frozenset(value.strip().lower() for value in values)
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.datetime.strptime(value[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+class RateIndex(object):
+    def __init__(self, shipments, today=None):
+        self.shipments = list(shipments)
+        today = today or datetime.date.today()
+
+        # parse every rate exactly once; rules below only compare the parsed values
+        self.rates = []
+        self.by_carrier_service = collections.defaultdict(list)
+        for shipment_index, shipment in enumerate(self.shipments):
+            indexed = []
+            rates = shipment.get('rates') if shipment is not None else None
+            for rate in rates or []:
+                delivery_days = rate.get('delivery_days')
+                delivery_date = _parse_date(rate.get('delivery_date'))
+                if delivery_date is None and delivery_days is not None:
+                    delivery_date = today + datetime.timedelta(days=delivery_days)
+                entry = IndexedRate(
+                    rate,
+                    decimal.Decimal(rate.rate),
+                    rate.carrier.lower(),
+                    rate.service.lower(),
+                    delivery_days,
+                    delivery_date,
+                )
+                indexed.append(entry)
+                self.by_carrier_service[(entry.carrier, entry.service)].append((shipment_index, entry))
+            self.rates.append(indexed)
+
+    def _candidates(self, carriers=None, services=None, max_amount=None, deliver_by=None):
+        carriers = _normalize_filter(carriers)
+        services = _normalize_filter(services)
+        if max_amount is not None:
+            max_amount = decimal.Decimal(six.text_type(max_amount))
+        deliver_by = _parse_date(deliver_by)
+
+        for indexed in self.rates:
+            yield [
+                entry for entry in indexed
+                if (carriers is None or entry.carrier in carriers) and
+                (services is None or entry.service in services) and
+                (max_amount is None or entry.amount <= max_amount) and
+                (deliver_by is None or (entry.delivery_date is not None and entry.delivery_date <= deliver_by))
+            ]
+
+    def _select(self, key, **filters):
+        chosen = []
+        for candidates in self._candidates(**filters):
+            chosen.append(min(candidates, key=key).rate if candidates else None)
+        return chosen
+
+    def cheapest(self, carriers=None, services=None, deliver_by=None):
+        return self._select(lambda entry: entry.amount, carriers=carriers, services=services, deliver_by=deliver_by)
+
+    def fastest(self, carriers=None, services=None, max_amount=None):
+        # rates without a delivery estimate sort last; ties go to the cheaper rate
+        def key(entry):
+            return (entry.delivery_days is None, entry.delivery_days or 0, entry.amount)
+        return self._select(key, carriers=carriers, services=services, max_amount=max_amount)
+
+    def for_carrier_service(self, carrier, service):
+        return self.by_carrier_service.get((carrier.lower(), service.lower()), [])
+
+
+class RateShopper(object):
+    RULES = ('cheapest', 'fastest')
+
+    def __init__(self, api_key=None, concurrency=8):
+        self.api_key = api_key
+        self.concurrency = concurrency
+
+    def create_shipments(self, shipment_params):
+        def create(params):
+            try:
+                return Shipment.create(api_key=self.api_key, **params), None
+            except Error as e:
+                return None, e
+
+        pool = ThreadPool(self.concurrency)
+        try:
+            results = pool.map(create, shipment_params)
+        finally:
+            pool.close()
+            pool.join()
+        shipments = [shipment for shipment, _ in results]
+        errors = [error for _, error in results]
+        return shipments, errors
+
+    def shop(self, shipment_params, rule='cheapest', **rule_params):
+        if rule not in self.RULES:
+            raise Error('Unknown rate shopping rule: %r' % rule)
+        shipments, errors = self.create_shipments(shipment_params)
+        index = RateIndex(shipments)
+        rates = getattr(index, rule)(**rule_params)
+        return [
+            RateChoice(shipment, rate, error)
+            for shipment, rate, error in zip(shipments, rates, errors)
+        ]
@@ -0,0 +1,98 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import six
+
+
+class RateTable(object):
+    def __init__(self, shipments):
+        # building the table walks every rate once, which costs about as much as calling `lowest_rate` on
+        # each shipment; the vectorized selections pay that back when several are made over the same shipments
+        if numpy is None:
+            raise ImportError('RateTable requires numpy. Install it via "pip install numpy".')
+
+        self.shipments = list(shipments)
+        self.rates = []
+        self.carriers = []
+        self.services = []
+        self._carrier_codes = {}
+        self._service_codes = {}
+
+        amounts = []
+        carriers = []
+        services = []
+        delivery_days = []
+        shipment_indexes = []
+        for shipment_index, shipment in enumerate(self.shipments):
+            rates = shipment.get('rates') if shipment is not None else None
+            for rate in rates or []:
+                days = rate.get('delivery_days')
+                self.rates.append(rate)
+                amounts.append(float(rate.get('rate')))
+                carriers.append(self._code(self._carrier_codes, self.carriers, rate.get('carrier')))
+                services.append(self._code(self._service_codes, self.services, rate.get('service')))
+                delivery_days.append(numpy.nan if days is None else days)
+                shipment_indexes.append(shipment_index)
+
+        self.amount = numpy.array(amounts, dtype=numpy.float64)
+        self.carrier = numpy.array(carriers, dtype=numpy.int32)
+        self.service = numpy.array(services, dtype=numpy.int32)
+        self.delivery_days = numpy.array(delivery_days, dtype=numpy.float64)
+        self.shipment_index = numpy.array(shipment_indexes, dtype=numpy.int64)
+
+    @staticmethod
+    def _code(codes, names, name):
+        name = name.lower()
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    def __len__(self):
+        return len(self.rates)
+
+    def _codes_for(self, codes, values):
+        if isinstance(values, six.string_types):
+            values = values.split(',')
+        return [codes[value.strip().lower()] for value in values if value.strip().lower() in codes]
+
+    def mask(self, carriers=None, services=None, max_amount=None, max_delivery_days=None):
+        mask = numpy.ones(len(self.rates), dtype=bool)
+        if carriers:
+            mask &= numpy.isin(self.carrier, self._codes_for(self._carrier_codes, carriers))
+        if services:
+            mask &= numpy.isin(self.service, self._codes_for(self._service_codes, services))
+        if max_amount is not None:
+            mask &= self.amount <= float(max_amount)
+        if max_delivery_days is not None:
+            # NaN (no estimate) never satisfies a delivery constraint
+            mask &= self.delivery_days <= max_delivery_days
+        return mask
+
+    def _first_per_shipment(self, order):
+        chosen = [None] * len(self.shipments)
+        if len(order):
+            shipment_index = self.shipment_index[order]
+            first = numpy.ones(len(order), dtype=bool)
+            first[1:] = shipment_index[1:] != shipment_index[:-1]
+            for row in order[first]:
+                chosen[self.shipment_index[row]] = self.rates[row]
+        return chosen
+
+    def lowest(self, mask=None, **filters):
+        if mask is None:
+            mask = self.mask(**filters)
+        rows = numpy.flatnonzero(mask)
+        # numpy.lexsort sorts by its last key first: shipment, then amount
+        order = rows[numpy.lexsort((self.amount[rows], self.shipment_index[rows]))]
+        return self._first_per_shipment(order)
+
+    def fastest(self, mask=None, **filters):
+        if mask is None:
+            mask = self.mask(**filters)
+        rows = numpy.flatnonzero(mask & ~numpy.isnan(self.delivery_days))
+        order = rows[numpy.lexsort((self.amount[rows], self.delivery_days[rows], self.shipment_index[rows]))]
+        return self._first_per_shipment(order)
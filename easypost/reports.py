@@ -0,0 +1,52 @@
+import csv
+import io
+
+import six
+
+from . import APIConnectionError, Error, Report, _error_class
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+
+def iter_csv_rows(url, timeout=60, session=None):
+    # stream a report CSV as dicts keyed by its header row, one row in memory at a time
+    if session is None:
+        if requests is None:
+            raise ImportError('Streaming reports requires requests. Install it via "pip install requests".')
+        session = requests
+    try:
+        response = session.get(url, stream=True, timeout=timeout)
+    except Exception as e:
+        raise APIConnectionError('Unable to download report %s' % url, original_exception=e)
+
+    try:
+        if response.status_code != 200:
+            raise _error_class(response.status_code)(
+                'Unable to download report %s: HTTP %d' % (url, response.status_code),
+                http_status=response.status_code, http_headers=response.headers)
+        response.raw.decode_content = True
+        # keep the raw stream readable at EOF so the text wrapper can finish its last read
+        response.raw.auto_close = False
+        if six.PY2:
+            lines = response.raw
+        else:
+            lines = io.TextIOWrapper(response.raw, encoding='utf-8', newline='')
+        try:
+            for row in csv.DictReader(lines):
+                yield row
+        except Exception as e:
+            raise APIConnectionError('Unable to read report %s' % url, original_exception=e)
+    finally:
+        response.close()
+
+
+def stream_report(type, api_key=None, timeout=None, initial_interval=1, max_interval=60, **params):
+    # create a report, wait for it with backoff and stream its rows
+    report = Report.create(api_key=api_key, type=type, **params)
+    report.wait_until(timeout=timeout, initial_interval=initial_interval, max_interval=max_interval)
+    if report.status != 'available':
+        raise Error('Report %s finished as %s' % (report.id, report.status))
+    return report.iter_rows()
@@ -0,0 +1,70 @@
+import collections
+import itertools
+import threading
+import time
+
+from . import DeadlineExceededError, Error
+
+
+PRIORITIES = ('interactive', 'bulk')
+
+
+class RequestScheduler(object):
+    def __init__(self, max_concurrent=10, reserved=2):
+        # at most `max_concurrent` requests are sent at once, and bulk requests never take the last
+        # `reserved` of those slots; waiting bulk requests are let through in the order they arrived
+        if not 0 <= reserved < max_concurrent:
+            raise Error('`reserved` must be at least 0 and less than `max_concurrent`')
+        self.max_concurrent = max_concurrent
+        self.reserved = reserved
+        self.in_flight = collections.Counter()
+        self.stats = collections.Counter()
+        self._interactive_waiting = 0
+        self._bulk_queue = collections.deque()
+        self._tickets = itertools.count()
+        self._cond = threading.Condition()
+
+    def _can_start(self, priority, ticket):
+        in_flight = sum(self.in_flight.values())
+        if priority == 'interactive':
+            return in_flight < self.max_concurrent
+        return (self._bulk_queue[0] == ticket and not self._interactive_waiting and
+                in_flight < self.max_concurrent - self.reserved)
+
+    def acquire(self, priority='interactive', deadline=None):
+        if priority not in PRIORITIES:
+            raise Error('Unknown request priority %s; use one of %s' % (priority, ', '.join(PRIORITIES)))
+        with self._cond:
+            ticket = next(self._tickets)
+            if priority == 'bulk':
+                self._bulk_queue.append(ticket)
+            else:
+                self._interactive_waiting += 1
+            try:
+                if not self._can_start(priority, ticket):
+                    self.stats['%s_queued' % priority] += 1
+                while not self._can_start(priority, ticket):
+                    remaining = deadline - time.time() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        self.stats['%s_expired' % priority] += 1
+                        raise DeadlineExceededError(
+                            'Request deadline exceeded while waiting for a %s request slot' % priority)
+                    self._cond.wait(remaining)
+            finally:
+                if priority == 'bulk':
+                    self._bulk_queue.remove(ticket)
+                else:
+                    self._interactive_waiting -= 1
+                # the next bulk request in line may be able to start now
+                self._cond.notify_all()
+            self.in_flight[priority] += 1
+            self.stats['%s_sent' % priority] += 1
+
+    def release(self, priority='interactive'):
+        with self._cond:
+            self.in_flight[priority] -= 1
+            self._cond.notify_all()
+
+    def queued(self):
+        with self._cond:
+            return {'interactive': self._interactive_waiting, 'bulk': len(self._bulk_queue)}
@@ -0,0 +1,133 @@
+import collections
+import threading
+
+from . import Tracker, convert_to_easypost_object, request_options
+
+
+TRACKER_EVENTS = ('tracker.created', 'tracker.updated')
+
+
+def _detail_key(detail):
+    return (detail.get('datetime'), detail.get('status'), detail.get('message'))
+
+
+class TrackerStore(object):
+    def __init__(self, api_key=None):
+        self.api_key = api_key
+        # newest update covered by a completed sync; events never move it, as a missed event is what sync
+        # has to catch up on
+        self.synced_until = None
+        self._trackers = {}
+        self._details = {}
+        self._detail_keys = {}
+        self._by_tracking_code = collections.defaultdict(set)
+        self._by_shipment = collections.defaultdict(set)
+        self._by_status = collections.defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._trackers)
+
+    def __contains__(self, tracker_id):
+        return tracker_id in self._trackers
+
+    def apply(self, tracker):
+        # merge a tracker payload into the store; returns only the tracking details not seen before
+        payload = tracker.to_dict() if hasattr(tracker, 'to_dict') else dict(tracker)
+        tracker_id = payload.get('id')
+        if tracker_id is None:
+            return []
+        details = payload.pop('tracking_details', None) or []
+
+        with self._lock:
+            current = self._trackers.get(tracker_id)
+            updated_at = payload.get('updated_at')
+            if current is None or (updated_at or '') >= (current.get('updated_at') or ''):
+                # out-of-order deliveries only contribute details, never roll the tracker's fields back
+                self._index(tracker_id, current, payload)
+                self._trackers[tracker_id] = payload
+
+            keys = self._detail_keys.setdefault(tracker_id, set())
+            stored = self._details.setdefault(tracker_id, [])
+            new = []
+            for detail in details:
+                key = _detail_key(detail)
+                if key not in keys:
+                    keys.add(key)
+                    new.append(detail)
+            if new:
+                stored.extend(new)
+                stored.sort(key=lambda detail: detail.get('datetime') or '')
+            return new
+
+    def _index(self, tracker_id, old, new):
+        for index, field in ((self._by_tracking_code, 'tracking_code'),
+                             (self._by_shipment, 'shipment_id'),
+                             (self._by_status, 'status')):
+            if old is not None and old.get(field) is not None:
+                index[old[field]].discard(tracker_id)
+                if not index[old[field]]:
+                    del index[old[field]]
+            if new.get(field) is not None:
+                index[new[field]].add(tracker_id)
+
+    def handle_event(self, event):
+        # usable directly as an `EventIngestor` handler
+        if event.get('description') not in TRACKER_EVENTS or event.get('result') is None:
+            return False
+        self.apply(event.result)
+        return True
+
+    def sync(self, page_size=100, **params):
+        # apply every tracker updated since the last completed sync; returns how many trackers were applied
+        if self.synced_until is not None:
+            params.setdefault('start_datetime', self.synced_until)
+        params['page_size'] = page_size
+        page = params.pop('page', 1)
+        newest = self.synced_until
+        count = 0
+        while True:
+            with request_options(priority='bulk'):
+                trackers, has_more = Tracker.all_updated(api_key=self.api_key, page=page, **params)
+            for tracker in trackers:
+                self.apply(tracker)
+                updated_at = tracker.get('updated_at')
+                if updated_at and (newest is None or updated_at > newest):
+                    newest = updated_at
+                count += 1
+            if not trackers or not has_more:
+                # only a sync that paged through everything may move the watermark
+                self.synced_until = newest
+                return count
+            page += 1
+
+    def _build(self, tracker_id):
+        payload = dict(self._trackers[tracker_id])
+        payload['tracking_details'] = list(self._details.get(tracker_id, []))
+        return convert_to_easypost_object(payload, self.api_key)
+
+    def _lookup(self, index, value):
+        with self._lock:
+            return [self._build(tracker_id) for tracker_id in sorted(index.get(value, ()))]
+
+    def get(self, tracker_id):
+        with self._lock:
+            return self._build(tracker_id) if tracker_id in self._trackers else None
+
+    def by_tracking_code(self, tracking_code):
+        # a tracking code may be reused across carriers, so this returns a list
+        return self._lookup(self._by_tracking_code, tracking_code)
+
+    def by_shipment(self, shipment_id):
+        return self._lookup(self._by_shipment, shipment_id)
+
+    def with_status(self, status):
+        return self._lookup(self._by_status, status)
+
+    def details(self, tracker_id):
+        with self._lock:
+            return list(self._details.get(tracker_id, []))
+
+    def counts(self):
+        with self._lock:
+            return dict((status, len(ids)) for status, ids in self._by_status.items())
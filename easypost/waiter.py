@@ -0,0 +1,113 @@
+import heapq
+import itertools
+import threading
+import time
+
+import six
+
+from . import Error
+
+
+class Waiter(object):
+    def __init__(self, states, attribute='state', event_description=None, initial_interval=1, max_interval=60,
+                 factor=2):
+        if isinstance(states, six.string_types):
+            states = [states]
+        self.states = frozenset(states)
+        self.attribute = attribute
+        self.event_description = event_description
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.done = {}
+        self.pending = {}
+        self.errors = {}
+        # objects given up on because refreshing them failed for good, e.g. with a 404
+        self.failed = {}
+        self._schedule = []
+        self._tokens = itertools.count()
+        self._cond = threading.Condition()
+
+    def add(self, obj):
+        with self._cond:
+            if obj.get(self.attribute) in self.states:
+                self.done[obj.id] = obj
+            else:
+                self._schedule_poll(obj, self.initial_interval)
+            self._cond.notify_all()
+
+    def handle_event(self, event):
+        # complete objects from webhook events instead of waiting for their next poll
+        if self.event_description is None or event.get('description') != self.event_description:
+            return False
+        result = event.get('result')
+        with self._cond:
+            if result is None or result.get('id') not in self.pending:
+                return False
+            obj, delay, _ = self.pending[result.id]
+            obj.refresh_from(result.to_dict(), obj._api_key)
+            self._update(obj, delay, changed=True)
+            self._cond.notify_all()
+        return True
+
+    def _update(self, obj, delay, changed):
+        if obj.get(self.attribute) in self.states:
+            self.pending.pop(obj.id, None)
+            self.done[obj.id] = obj
+            return
+        # poll quickly while the object is making progress, back off while it is not
+        delay = self.initial_interval if changed else min(delay * self.factor, self.max_interval)
+        self._schedule_poll(obj, delay)
+
+    def _schedule_poll(self, obj, delay):
+        # rescheduling a obj supersedes its earlier entry in the schedule
+        token = next(self._tokens)
+        self.pending[obj.id] = (obj, delay, token)
+        heapq.heappush(self._schedule, (time.time() + delay, token, obj.id))
+
+    def _next_due(self, deadline):
+        with self._cond:
+            while self.pending:
+                now = time.time()
+                if deadline is not None and now >= deadline:
+                    return None
+                due, token, obj_id = self._schedule[0]
+                if obj_id not in self.pending or self.pending[obj_id][2] != token:
+                    # finished or rescheduled by an event since this entry was scheduled
+                    heapq.heappop(self._schedule)
+                    continue
+                if due <= now:
+                    heapq.heappop(self._schedule)
+                    return self.pending[obj_id]
+                wait = due - now if deadline is None else min(due, deadline) - now
+                self._cond.wait(wait)
+            return None
+
+    def wait(self, timeout=None):
+        # returns False on timeout; objects that failed for good are not waited for, see `failed`
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            due = self._next_due(deadline)
+            if due is None:
+                return not self.pending
+            obj, delay, token = due
+            state = obj.get(self.attribute)
+            try:
+                obj.refresh()
+            except Error as e:
+                self.errors[obj.id] = e
+                if not e.retryable:
+                    with self._cond:
+                        if obj.id in self.pending and self.pending[obj.id][2] == token:
+                            del self.pending[obj.id]
+                            self.failed[obj.id] = e
+                    continue
+            with self._cond:
+                if obj.id in self.pending and self.pending[obj.id][2] == token:
+                    self._update(obj, delay, changed=obj.get(self.attribute) != state)
+
+
+class BatchWaiter(Waiter):
+    def __init__(self, states, **kwargs):
+        kwargs.setdefault('event_description', 'batch.updated')
+        super(BatchWaiter, self).__init__(states, **kwargs)
@@ -0,0 +1,173 @@
+import collections
+import hashlib
+import hmac
+import threading
+import time
+import unicodedata
+
+import six
+from six.moves import queue
+
+from . import Error, Event, _get_header
+
+
+SIGNATURE_HEADER = 'X-Hmac-Signature'
+SIGNATURE_PREFIX = 'hmac-sha256-hex='
+
+
+class SignatureVerificationError(Error):
+    pass
+
+
+class WebhookVerifier(object):
+    def __init__(self, secrets, api_key=None):
+        # pass several secrets while rotating them; a payload signed with any of them is accepted
+        if isinstance(secrets, (six.text_type, six.binary_type)):
+            secrets = [secrets]
+        self._keys = [self._normalize(secret) for secret in secrets]
+        if not self._keys:
+            raise Error('At least one webhook secret is required')
+        self.api_key = api_key
+
+    @staticmethod
+    def _normalize(secret):
+        if isinstance(secret, six.binary_type):
+            secret = secret.decode('utf-8')
+        return unicodedata.normalize('NFKD', secret).encode('utf-8')
+
+    def is_valid(self, body, signature):
+        if signature is None:
+            return False
+        if isinstance(body, six.text_type):
+            body = body.encode('utf-8')
+        if isinstance(signature, six.binary_type):
+            signature = signature.decode('utf-8', 'replace')
+        signature = signature.encode('utf-8')
+
+        # check every secret so the time taken does not reveal which one matched
+        valid = False
+        for key in self._keys:
+            expected = (SIGNATURE_PREFIX + hmac.new(key, body, hashlib.sha256).hexdigest()).encode('utf-8')
+            valid |= hmac.compare_digest(expected, signature)
+        return valid
+
+    def verify(self, body, headers):
+        # check the signature over the raw bytes, then parse them once
+        if not self.is_valid(body, _get_header(headers, SIGNATURE_HEADER)):
+            raise SignatureVerificationError('Webhook signature does not match the payload')
+        return Event.receive(body, self.api_key)
+
+    def verify_all(self, payloads):
+        # verify a batch of queued (body, headers) pairs; returns the Event or the error for each
+        results = []
+        for body, headers in payloads:
+            try:
+                results.append(self.verify(body, headers))
+            except Error as e:
+                results.append(e)
+        return results
+
+
+class EventIngestor(object):
+    def __init__(self, workers=4, queue_size=1000, dedupe_window=600, dedupe_size=100000, api_key=None,
+                 verifier=None):
+        self.workers = workers
+        self.verifier = verifier
+        self.dedupe_window = dedupe_window
+        self.dedupe_size = dedupe_size
+        self.api_key = api_key
+        self.on_error = None
+        self.stats = collections.Counter()
+        self._handlers = collections.defaultdict(list)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._seen = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def on(self, description, handler=None):
+        # register a handler for an event description such as "tracker.updated", or "*" for every event;
+        # usable as a decorator
+        if handler is None:
+            return lambda handler: self.on(description, handler)
+        self._handlers[description].append(handler)
+        return handler
+
+    def start(self):
+        for _ in range(self.workers - len(self._threads)):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _is_duplicate(self, event_id, now):
+        with self._lock:
+            while self._seen:
+                oldest_id, seen_at = next(iter(self._seen.items()))
+                if seen_at > now - self.dedupe_window and len(self._seen) < self.dedupe_size:
+                    break
+                del self._seen[oldest_id]
+            if event_id in self._seen:
+                return True
+            self._seen[event_id] = now
+            return False
+
+    def submit(self, payload, block=True, timeout=None, headers=None):
+        # verify, parse, deduplicate and queue a raw webhook body; returns the Event, or None for a duplicate.
+        # raises Error when the queue stays full, so the endpoint can answer with a retryable status
+        if self.verifier is not None:
+            event = self.verifier.verify(payload, headers)
+        else:
+            event = Event.receive(payload, self.api_key)
+        self._count('received')
+        event_id = event.get('id')
+        if event_id is not None and self._is_duplicate(event_id, time.time()):
+            self._count('duplicates')
+            return None
+
+        handlers = self._handlers.get(event.get('description'), []) + self._handlers.get('*', [])
+        if not handlers:
+            self._count('unrouted')
+            return event
+        try:
+            self._queue.put((event, handlers), block, timeout)
+        except queue.Full:
+            self._count('rejected')
+            with self._lock:
+                # let the sender's retry through once there is room again
+                self._seen.pop(event_id, None)
+            raise Error('Webhook event queue is full; retry later')
+        return event
+
+    def join(self):
+        # wait until every queued event has been handled
+        self._queue.join()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                event, handlers = item
+                for handler in handlers:
+                    try:
+                        handler(event)
+                        self._count('handled')
+                    except Exception as e:
+                        self._count('failed')
+                        if self.on_error is not None:
+                            self.on_error(event, e)
+            finally:
+                self._queue.task_done()
@@ -1,5 +1,3 @@
-from time import sleep
-
 import easypost
 easypost.api_key = 'cueqNZUb3ldeWTNX7MU3Mel8UXtaAMUi'
 # easypost.api_base = 'http://localhost:5000/v2'
@@ -49,11 +47,9 @@ for order in order_list:
 # create batch of shipments
 batch = easypost.Batch.create_and_buy(shipment=shipments)
 
-# Poll while waiting for the batch to purchase the shipments
-while batch.state in ("creating", "queued_for_purchase", "purchasing"):
-    sleep(5)
-    batch.refresh()
-    print(batch.state)
+# Wait for the batch to purchase the shipments; polling backs off while the state is unchanged
+batch.wait_until(["purchased", "purchase_failed"], timeout=600)
+print(batch.state)
 
 # Insure the shipments after purchase
 if batch.state == "purchased":
@@ -1,9 +1,11 @@
 # setup for py.test
 
 import os
+import threading
 
 import easypost
 import pytest
+from six.moves import BaseHTTPServer
 
 
 TEST_API_KEY = os.environ['TEST_API_KEY']
@@ -45,3 +47,23 @@ def vcr_config():
             ('user-agent', 'easypost/v2 pythonclient/suppressed'),
         ],
     }
+
+
+# starts a local HTTP server for the given `BaseHTTPRequestHandler` subclass and returns its base url;
+# every server started by a test is shut down after it
+@pytest.yield_fixture()
+def local_server():
+    servers = []
+
+    def start(handler):
+        server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        servers.append(server)
+        return 'http://127.0.0.1:%d' % server.server_address[1]
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -1,7 +1,9 @@
 # Unit tests related to 'Address' (https://www.easypost.com/docs/api#addresses).
 
-import easypost
+import json
 
+import easypost
+import mock
 import pytest
 
 
@@ -114,3 +116,71 @@ def test_address_bytestring():
 
     address = easypost.Address.create(state=state.encode('utf-8'))
     assert address.state == state
+
+
+@pytest.fixture
+def verification_cache(tmpdir):
+    cache = easypost.AddressVerificationCache(maxsize=10, ttl=3600, path=str(tmpdir.join('addresses.db')))
+    with mock.patch.object(easypost, 'address_verification_cache', cache):
+        yield cache
+
+
+def test_address_verification_cache_normalizes_input(verification_cache):
+    # Verifying the same address twice, spelled slightly differently, only hits the API once.
+    body = json.dumps({'object': 'Address', 'id': 'adr_123', 'street1': '388 TOWNSEND ST'})
+    with mock.patch.object(easypost.Requestor, 'requests_request', return_value=(body, 200, {})) as request:
+        first = easypost.Address.create(verify=['delivery'], street1='388 Townsend St', zip='94107')
+        second = easypost.Address.create(verify=['delivery'], street1='  388  TOWNSEND st', zip='94107 ')
+        # a different verification mode is cached separately
+        easypost.Address.create(verify_strict=['delivery'], street1='388 Townsend St', zip='94107')
+
+    assert request.call_count == 2
+    assert first.id == second.id == 'adr_123'
+
+
+def test_address_verification_cache_remembers_failures(verification_cache):
+    body = json.dumps({'error': {'code': 'ADDRESS.VERIFY.FAILURE', 'message': 'Unable to verify address.'}})
+    with mock.patch.object(easypost.Requestor, 'requests_request', return_value=(body, 422, {})) as request:
+        for _ in range(2):
+            with pytest.raises(easypost.Error) as caught_exception:
+                easypost.Address.create_and_verify(street1='UNDELIVERABLE ST', zip='00000')
+            assert caught_exception.value.http_status == 422
+            assert caught_exception.value.json_body['error']['code'] == 'ADDRESS.VERIFY.FAILURE'
+
+    assert request.call_count == 1
+
+
+def test_address_verification_cache_backing_store(verification_cache):
+    # Results survive the in-memory cache being dropped, e.g. after a restart.
+    body = json.dumps({'object': 'Address', 'id': 'adr_123', 'verifications': {}})
+    address = easypost.Address.construct_from({'id': 'adr_123', 'street1': '388 Townsend St', 'zip': '94107'})
+    with mock.patch.object(easypost.Requestor, 'requests_request', return_value=(body, 200, {})) as request:
+        address.verify()
+        verification_cache.memory.clear()
+        verified = address.verify()
+
+    assert request.call_count == 1
+    assert verified.id == 'adr_123'
+    assert verification_cache.stats()['store']['hits'] == 1
+
+
+def test_address_verification_cache_keys_by_address_id(verification_cache):
+    def verify_response(method, abs_url, headers, params, request_timeout=None):
+        address_id = abs_url.split('/')[-2]
+        return json.dumps({'address': {'object': 'Address', 'id': address_id}}), 200, {}
+
+    with mock.patch.object(easypost.Requestor, 'requests_request', side_effect=verify_response) as request:
+        assert easypost.Address('adr_A').verify().id == 'adr_A'
+        assert easypost.Address('adr_B').verify().id == 'adr_B'
+        assert easypost.Address('adr_A').verify().id == 'adr_A'
+
+    assert request.call_count == 2
+
+
+def test_address_verification_store_hashes_api_key(verification_cache, tmpdir):
+    body = json.dumps({'object': 'Address', 'id': 'adr_123'})
+    with mock.patch.object(easypost.Requestor, 'requests_request', return_value=(body, 200, {})):
+        easypost.Address.create(api_key='sk_live_SECRET123', verify=['delivery'], street1='388 Townsend St')
+
+    with open(str(tmpdir.join('addresses.db')), 'rb') as f:
+        assert b'SECRET123' not in f.read()
@@ -1,8 +1,12 @@
 # Unit tests related to 'Batch' (https://www.easypost.com/docs/api#batches).
 
+import json
+import threading
+from time import sleep
+
 import easypost
+import mock
 import pytest
-from time import sleep
 
 
 @pytest.mark.vcr()
@@ -87,3 +91,141 @@ def test_batch_create_and_buy(vcr):
 
     # Assert on tracker
     assert batch.shipments[0].tracker.tracking_code and batch.shipments[0].tracker.shipment_id
+
+
+def batch_body(batch_id, state):
+    return json.dumps({'object': 'Batch', 'id': batch_id, 'state': state}), 200, {}
+
+
+def test_batch_wait_until_backs_off_while_unchanged():
+    batch = easypost.Batch.construct_from({'id': 'batch_123', 'state': 'creating'})
+    responses = [batch_body('batch_123', state) for state in ('creating', 'creating', 'created', 'purchased')]
+
+    with mock.patch.object(easypost.Requestor, 'requests_request', side_effect=responses) as request:
+        batch.wait_until(['purchased', 'purchase_failed'], initial_interval=0.01, max_interval=0.05)
+
+    assert batch.state == 'purchased'
+    assert request.call_count == 4
+
+
+def test_batch_wait_until_times_out():
+    batch = easypost.Batch.construct_from({'id': 'batch_123', 'state': 'creating'})
+
+    with mock.patch.object(easypost.Requestor, 'requests_request', return_value=batch_body('batch_123', 'creating')):
+        with pytest.raises(easypost.Error) as caught_exception:
+            batch.wait_until('purchased', timeout=0.05, initial_interval=0.01)
+
+    assert 'batch_123' in str(caught_exception.value)
+
+
+def test_batch_wait_until_stops_on_permanent_errors():
+    batch = easypost.Batch.construct_from({'id': 'batch_123', 'state': 'creating'})
+    responses = [
+        (json.dumps({'error': {'message': 'Service unavailable'}}), 503, {}),
+        (json.dumps({'error': {'message': 'Not found'}}), 404, {}),
+    ]
+
+    with mock.patch.object(easypost.Requestor, 'requests_request', side_effect=responses) as request:
+        with pytest.raises(easypost.NotFoundError):
+            batch.wait_until('purchased', initial_interval=0.01)
+
+    assert request.call_count == 2
+
+
+def test_batch_waiter_completes_from_events():
+    batches = [easypost.Batch.construct_from({'id': 'batch_%d' % i, 'state': 'creating'}) for i in range(3)]
+    waiter = easypost.BatchWaiter(['purchased'], initial_interval=10)
+    for batch in batches:
+        waiter.add(batch)
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(waiter.wait(timeout=5)))
+    with mock.patch.object(easypost.Requestor, 'requests_request') as request:
+        thread.start()
+        for batch in batches:
+            event = easypost.Event.receive(json.dumps({
+                'object': 'Event',
+                'description': 'batch.updated',
+                'result': {'object': 'Batch', 'id': batch.id, 'state': 'purchased'},
+            }))
+            assert waiter.handle_event(event)
+        thread.join()
+
+    assert results == [True]
+    assert request.call_count == 0
+    assert sorted(waiter.done) == ['batch_0', 'batch_1', 'batch_2']
+    assert all(batch.state == 'purchased' for batch in batches)
+
+
+def test_bulk_purchase_shards_and_merges_results(tmpdir):
+    shipments = [{'reference': 'order-%d' % i, 'carrier': 'USPS', 'service': 'Priority'} for i in range(5)]
+    created = []
+
+    def fake_request(method, abs_url, headers, params, request_timeout=None):
+        if method == 'post':
+            shard = params['batch']['shipment']
+            batch_id = 'batch_%d' % len(created)
+            created.append(batch_id)
+            return json.dumps({
+                'object': 'Batch',
+                'id': batch_id,
+                'state': 'purchased',
+                'shipments': [
+                    {'id': 'shp_%s' % s['reference'], 'reference': s['reference'], 'batch_status': 'postage_purchased'}
+                    for s in shard
+                ],
+            }), 200, {}
+        batch_id = abs_url.rsplit('/', 1)[-1]
+        return json.dumps({'object': 'Batch', 'id': batch_id, 'state': 'purchased', 'shipments': []}), 200, {}
+
+    checkpoint = easypost.FileCache(str(tmpdir))
+    with mock.patch.object(easypost.Requestor, 'requests_request', side_effect=fake_request):
+        report = easypost.BulkPurchase(max_batch_size=2, checkpoint=checkpoint, run_id='orders').run(shipments)
+
+    # five shipments with at most two per batch become three batches
+    assert len(created) == 3
+    assert report.errors == {}
+    assert sorted(report.results) == ['order-%d' % i for i in range(5)]
+    assert report.results['order-3']['status'] == 'postage_purchased'
+
+    # resuming the run with the same checkpoint retrieves the batches instead of buying them again
+    with mock.patch.object(easypost.Requestor, 'requests_request', side_effect=fake_request) as request:
+        report = easypost.BulkPurchase(max_batch_size=2, checkpoint=checkpoint, run_id='orders').run(shipments)
+
+    assert len(created) == 3
+    assert all(call[0][0] == 'get' for call in request.call_args_list)
+    assert sorted(batch.id for batch in report.batches) == ['batch_0', 'batch_1', 'batch_2']
+
+    # a new run buys the same shipments again, under new idempotency keys
+    with mock.patch.object(easypost.Requestor, 'requests_request', side_effect=fake_request) as request:
+        easypost.BulkPurchase(max_batch_size=2, checkpoint=checkpoint, run_id='reorder').run(shipments)
+
+    assert len(created) == 6
+    keys = set(call[0][2]['Idempotency-Key'] for call in request.call_args_list if call[0][0] == 'post')
+    assert len(keys) == 3
+    assert all(key.startswith('reorder-') for key in keys)
+
+
+def test_bulk_purchase_reports_errors_by_reference():
+    shipments = [{'reference': 'order-0'}, {'carrier': 'USPS'}, {'reference': 'order-2'}, {'id': 'shp_3'}]
+
+    def fake_request(method, abs_url, headers, params, request_timeout=None):
+        if params['batch']['shipment'][0].get('reference') == 'order-0':
+            return json.dumps({'error': {'message': 'Insufficient funds'}}), 402, {}
+        return json.dumps({'object': 'Batch', 'id': 'batch_1', 'state': 'purchased', 'shipments': []}), 200, {}
+
+    with mock.patch.object(easypost.Requestor, 'requests_request', side_effect=fake_request):
+        report = easypost.BulkPurchase(max_batch_size=2).run(shipments)
+
+    # a shipment without a reference is reported by its position
+    assert sorted(report.errors) == ['#1', 'order-0']
+    assert isinstance(report.errors['#1'], easypost.PaymentError)
+    assert [batch.id for batch in report.batches] == ['batch_1']
+
+
+def test_bulk_purchase_shard_sizes():
+    from easypost.bulk import shard
+
+    assert [len(s) for s in shard(list(range(10)), 4)] == [4, 3, 3]
+    assert [len(s) for s in shard(list(range(9)), 4)] == [3, 3, 3]
+    assert shard([], 4) == []
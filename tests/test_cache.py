@@ -0,0 +1,180 @@
+# Unit tests related to client-side caching of API responses.
+
+import json
+
+import easypost
+import mock
+import pytest
+from six.moves import BaseHTTPServer
+
+
+@pytest.fixture
+def reference_cache():
+    cache = easypost.TTLCache(ttl=60)
+    with mock.patch.object(easypost, 'reference_cache', cache):
+        yield cache
+
+
+def test_reference_cache_hits(reference_cache):
+    body = json.dumps([{'object': 'CarrierType', 'type': 'UpsAccount'}])
+    with mock.patch.object(easypost.Requestor, 'requests_request', return_value=(body, 200, {})) as request:
+        first = easypost.CarrierAccount.types()
+        second = easypost.CarrierAccount.types()
+
+    assert request.call_count == 1
+    assert first[0].type == second[0].type == 'UpsAccount'
+    assert first[0] is not second[0]
+    assert reference_cache.stats() == {'hits': 1, 'misses': 1, 'size': 1}
+
+
+def test_reference_cache_expires(reference_cache):
+    body = json.dumps({'object': 'User', 'id': 'user_123', 'name': 'Test'})
+    with mock.patch.object(easypost.Requestor, 'requests_request', return_value=(body, 200, {})) as request, \
+            mock.patch('easypost.cache.time.time', side_effect=[0, 61, 62]):
+        easypost.User.retrieve()
+        easypost.User.retrieve()
+
+    assert request.call_count == 2
+
+
+def test_reference_cache_invalidated_by_writes(reference_cache):
+    list_body = json.dumps([{'object': 'CarrierAccount', 'id': 'ca_123'}])
+    account_body = json.dumps({'object': 'CarrierAccount', 'id': 'ca_123', 'description': 'new'})
+
+    def fake_request(method, abs_url, headers, params, request_timeout=None):
+        return (list_body if method == 'get' else account_body), 200, {}
+
+    with mock.patch.object(easypost.Requestor, 'requests_request', side_effect=fake_request) as request:
+        easypost.CarrierAccount.all()
+        easypost.CarrierAccount.all()
+        assert request.call_count == 1
+
+        account = easypost.CarrierAccount.construct_from({'id': 'ca_123'})
+        account.description = 'new'
+        account.save()
+        easypost.CarrierAccount.all()
+
+    assert request.call_count == 3
+
+
+@pytest.mark.parametrize('backend', ['lru', 'file', 'sqlite'])
+def test_reference_cache_backends_invalidate_on_writes(backend, tmpdir):
+    cache = {
+        'lru': lambda: easypost.LRUCache(),
+        'file': lambda: easypost.FileCache(str(tmpdir)),
+        'sqlite': lambda: easypost.SQLiteCache(str(tmpdir.join('cache.db'))),
+    }[backend]()
+    list_body = json.dumps([{'object': 'CarrierAccount', 'id': 'ca_123'}])
+    account_body = json.dumps({'object': 'CarrierAccount', 'id': 'ca_123'})
+
+    def fake_request(method, abs_url, headers, params, request_timeout=None):
+        return (list_body if method == 'get' else account_body), 200, {}
+
+    with mock.patch.object(easypost, 'reference_cache', cache), \
+            mock.patch.object(easypost.Requestor, 'requests_request', side_effect=fake_request) as request:
+        easypost.CarrierAccount.all()
+        easypost.CarrierAccount.all()
+        easypost.CarrierAccount.types()
+        assert request.call_count == 2
+
+        account = easypost.CarrierAccount.create(type='UpsAccount')
+        assert account.id == 'ca_123'
+        easypost.CarrierAccount.all()
+        easypost.CarrierAccount.types()
+
+    # the write dropped the cached list of carrier accounts, but not the carrier types
+    assert request.call_count == 4
+    assert cache.stats()['size'] == 2
+
+
+def test_reference_cache_invalidated_after_write_returns(reference_cache):
+    list_body = json.dumps([{'object': 'CarrierAccount', 'id': 'ca_123'}])
+    calls = []
+
+    def fake_request(method, abs_url, headers, params, request_timeout=None):
+        calls.append(method)
+        if method == 'get':
+            return list_body, 200, {}
+        # a read racing with the write caches the list before the write has finished
+        easypost.CarrierAccount.all()
+        return json.dumps({'error': {'message': 'Invalid'}}), 422, {}
+
+    with mock.patch.object(easypost.Requestor, 'requests_request', side_effect=fake_request):
+        account = easypost.CarrierAccount.construct_from({'id': 'ca_123'})
+        account.description = 'new'
+        with pytest.raises(easypost.Error):
+            account.save()
+        easypost.CarrierAccount.all()
+
+    assert calls == ['put', 'get', 'get']
+
+
+def test_reference_cache_explicit_invalidation(reference_cache):
+    body = json.dumps({'object': 'ApiKeys', 'id': 'user_123', 'keys': []})
+    with mock.patch.object(easypost.Requestor, 'requests_request', return_value=(body, 200, {})) as request:
+        easypost.User.all_api_keys()
+        reference_cache.invalidate('/api_keys')
+        easypost.User.all_api_keys()
+        easypost.User.all_api_keys()
+
+    assert request.call_count == 2
+    assert reference_cache.hits == 1
+
+
+class ConditionalGetHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    etag = '"batch-v1"'
+    bodies_sent = 0
+
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = json.dumps({'object': 'Batch', 'id': 'batch_123', 'state': 'purchased'}).encode('utf-8')
+        type(self).bodies_sent += 1
+        self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_api(local_server):
+    ConditionalGetHandler.bodies_sent = 0
+    with mock.patch.object(easypost, 'api_base', local_server(ConditionalGetHandler) + '/v2'):
+        yield ConditionalGetHandler
+
+
+@pytest.mark.parametrize('backend', ['memory', 'file'])
+def test_conditional_get_reuses_cached_body(local_api, backend, tmpdir):
+    if backend == 'memory':
+        cache = easypost.LRUCache(maxsize=10)
+    else:
+        cache = easypost.FileCache(str(tmpdir))
+
+    with mock.patch.object(easypost, 'response_cache', cache):
+        batch = easypost.Batch.retrieve('batch_123')
+        batch.refresh()
+        batch.refresh()
+
+    assert local_api.bodies_sent == 1
+    assert batch.state == 'purchased'
+    assert cache.stats()['hits'] == 2
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = easypost.LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
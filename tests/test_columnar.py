@@ -0,0 +1,74 @@
+# Unit tests related to exporting lists of objects as columns for analytics.
+
+import json
+
+import easypost
+import mock
+import pytest
+
+
+SHIPMENT_PAYLOADS = [
+    {
+        'object': 'Shipment',
+        'id': 'shp_2',
+        'reference': 'order-2',
+        'to_address': {'zip': '94107'},
+        'rates': [{'carrier': 'USPS', 'rate': '7.68'}, {'carrier': 'UPS', 'rate': '9.10'}],
+    },
+    {
+        'object': 'Shipment',
+        'id': 'shp_1',
+        'reference': 'order-1',
+        'to_address': None,
+        'rates': [],
+    },
+]
+
+
+def test_to_columns_from_payloads_and_objects():
+    fields = ['id', 'to_address.zip', 'rates.0.rate', 'missing']
+    expected = {
+        'id': ['shp_2', 'shp_1'],
+        'to_address.zip': ['94107', None],
+        'rates.0.rate': ['7.68', None],
+        'missing': [None, None],
+    }
+
+    assert easypost.to_columns(SHIPMENT_PAYLOADS, fields) == expected
+
+    shipments = easypost.convert_to_easypost_object(SHIPMENT_PAYLOADS, None)
+    assert easypost.to_columns(shipments, fields) == expected
+
+
+def test_iter_nested_rates():
+    rates = easypost.iter_nested(SHIPMENT_PAYLOADS, 'rates', {'shipment_id': 'id'})
+    columns = easypost.to_columns(rates, ['shipment_id', 'carrier', 'rate'])
+
+    assert columns == {
+        'shipment_id': ['shp_2', 'shp_2'],
+        'carrier': ['USPS', 'UPS'],
+        'rate': ['7.68', '9.10'],
+    }
+
+
+def test_iter_payloads_pages_without_building_objects():
+    pages = [
+        {'shipments': SHIPMENT_PAYLOADS[:1], 'has_more': True},
+        {'shipments': SHIPMENT_PAYLOADS[1:], 'has_more': False},
+    ]
+
+    with mock.patch.object(easypost.Requestor, 'requests_request',
+                           side_effect=[(json.dumps(page), 200, {}) for page in pages]) as request:
+        payloads = list(easypost.iter_payloads(easypost.Shipment, page_size=1))
+
+    assert [payload['id'] for payload in payloads] == ['shp_2', 'shp_1']
+    assert all(type(payload) is dict for payload in payloads)
+    assert request.call_args_list[1][0][3] == {'page_size': 1, 'before_id': 'shp_2'}
+
+
+def test_to_arrow():
+    pytest.importorskip('pyarrow')
+    table = easypost.to_arrow(SHIPMENT_PAYLOADS, ['id', 'reference'])
+
+    assert table.column_names == ['id', 'reference']
+    assert table.num_rows == 2
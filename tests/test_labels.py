@@ -0,0 +1,178 @@
+# Unit tests related to downloading purchased labels (https://www.easypost.com/docs/api#postage-label-object).
+
+import gzip
+import io
+import json
+import os
+
+import easypost
+import mock
+import pytest
+from six.moves import BaseHTTPServer
+
+
+LABELS = {
+    '/labels/shp_1.png': b'\x89PNG' + b'a' * 200000,
+    '/labels/shp_2.zpl': b'^XA^FDshp_2^FS^XZ',
+    '/labels/batch_1.zpl': b'^XA^FDbatch_1^FS^XZ\n',
+}
+for i in range(20):
+    LABELS['/labels/wave_%d.zpl' % i] = ('^XA^FDwave_%d^FS^XZ' % i).encode('utf-8')
+
+
+class LabelHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/labels/truncated.pdf':
+            # advertise more bytes than are sent
+            self.send_response(200)
+            self.send_header('Content-Length', '100')
+            self.end_headers()
+            self.wfile.write(b'%PDF-1.4')
+            return
+        if self.path == '/labels/gzipped.zpl':
+            buf = io.BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+                f.write(b'^XA^FDgzipped^FS^XZ' * 100)
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(buf.getvalue())))
+            self.end_headers()
+            self.wfile.write(buf.getvalue())
+            return
+        body = LABELS.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def label_server(local_server):
+    return local_server(LabelHandler)
+
+
+def make_shipment(shipment_id, **postage_label):
+    return easypost.convert_to_easypost_object({
+        'object': 'Shipment',
+        'id': shipment_id,
+        'postage_label': dict(object='PostageLabel', **postage_label),
+    }, None)
+
+
+def test_label_fetcher_downloads_concurrently(label_server, tmpdir):
+    shipments = [
+        make_shipment('shp_1', label_url=label_server + '/labels/shp_1.png'),
+        make_shipment('shp_2', label_url=label_server + '/labels/shp_1.png',
+                      label_zpl_url=label_server + '/labels/shp_2.zpl'),
+        make_shipment('shp_3', label_url=label_server + '/labels/missing.png'),
+    ]
+    fetcher = easypost.LabelFetcher(concurrency=3, chunk_size=4096)
+
+    results = fetcher.download(shipments[:1] + shipments[2:], str(tmpdir))
+    assert results['shp_1'] == os.path.join(str(tmpdir), 'shp_1.png')
+    with open(results['shp_1'], 'rb') as f:
+        assert f.read() == LABELS['/labels/shp_1.png']
+    assert results['shp_3'].http_status == 404
+    assert sorted(os.listdir(str(tmpdir))) == ['shp_1.png']
+
+    results = fetcher.download(shipments[1:2], str(tmpdir), file_format='ZPL')
+    with open(results['shp_2'], 'rb') as f:
+        assert f.read() == LABELS['/labels/shp_2.zpl']
+
+
+def test_label_fetcher_requests_missing_format(label_server):
+    shipment = make_shipment('shp_2', label_url=label_server + '/labels/shp_1.png')
+    body = json.dumps({
+        'object': 'Shipment',
+        'id': 'shp_2',
+        'postage_label': {'object': 'PostageLabel', 'label_zpl_url': label_server + '/labels/shp_2.zpl'},
+    })
+    sink = io.BytesIO()
+
+    with mock.patch.object(easypost.Requestor, 'requests_request', return_value=(body, 200, {})) as request:
+        url = easypost.labels.label_url(shipment, 'zpl')
+        easypost.LabelFetcher().fetch(url, sink)
+
+    assert request.call_args[0][3] == {'file_format': 'zpl'}
+    assert sink.getvalue() == LABELS['/labels/shp_2.zpl']
+
+
+def test_label_fetcher_verifies_size(label_server, tmpdir):
+    path = str(tmpdir.join('truncated.pdf'))
+    with pytest.raises(easypost.Error):
+        easypost.LabelFetcher().fetch(label_server + '/labels/truncated.pdf', path)
+
+    assert os.listdir(str(tmpdir)) == []
+
+
+def test_label_fetcher_accepts_compressed_labels(label_server):
+    # Content-Length is the compressed size, while the label is decoded while streaming
+    sink = io.BytesIO()
+    size = easypost.LabelFetcher().fetch(label_server + '/labels/gzipped.zpl', sink)
+
+    assert sink.getvalue() == b'^XA^FDgzipped^FS^XZ' * 100
+    assert size == len(sink.getvalue())
+
+
+def test_merge_zpl_labels_in_order(label_server):
+    shipments = [
+        make_shipment('shp_%d' % i, label_zpl_url=label_server + '/labels/wave_%d.zpl' % i) for i in range(20)
+    ]
+    sink = io.BytesIO()
+
+    count = easypost.LabelFetcher(concurrency=4).merge(shipments, sink, file_format='zpl', prefetch=3)
+
+    assert count == 20
+    assert sink.getvalue() == b''.join(LABELS['/labels/wave_%d.zpl' % i] + b'\n' for i in range(20))
+
+
+def test_merge_uses_batch_label_file(label_server):
+    batch = easypost.convert_to_easypost_object({
+        'object': 'Batch',
+        'id': 'batch_1',
+        'label_url': label_server + '/labels/batch_1.zpl',
+        'shipments': [{'id': 'shp_1'}],
+    }, None)
+    sink = io.BytesIO()
+
+    assert easypost.LabelFetcher().merge(batch, sink, file_format='zpl') is None
+    assert sink.getvalue() == LABELS['/labels/batch_1.zpl']
+
+    with pytest.raises(easypost.Error):
+        easypost.LabelFetcher().merge(batch, sink, file_format='png')
+
+
+def test_merge_files_splits_labels(label_server, tmpdir):
+    shipments = [
+        make_shipment('shp_%d' % i, label_zpl_url=label_server + '/labels/wave_%d.zpl' % i) for i in range(5)
+    ]
+    template = str(tmpdir.join('labels-%d.zpl'))
+
+    paths = easypost.LabelFetcher().merge_files(shipments, template, file_format='zpl', labels_per_file=2)
+
+    assert paths == [template % part for part in (1, 2, 3)]
+    with open(paths[2], 'rb') as f:
+        assert f.read() == LABELS['/labels/wave_4.zpl'] + b'\n'
+    assert sorted(os.listdir(str(tmpdir))) == ['labels-1.zpl', 'labels-2.zpl', 'labels-3.zpl']
+
+
+def test_merge_pdf_labels(label_server):
+    pypdf = pytest.importorskip('pypdf')
+    for i in range(2):
+        writer = pypdf.PdfWriter()
+        writer.add_blank_page(width=288, height=432)
+        pdf = io.BytesIO()
+        writer.write(pdf)
+        LABELS['/labels/page_%d.pdf' % i] = pdf.getvalue()
+    shipments = [make_shipment('shp_%d' % i, label_pdf_url=label_server + '/labels/page_%d.pdf' % i) for i in range(2)]
+    sink = io.BytesIO()
+
+    assert easypost.LabelFetcher().merge(shipments, sink, file_format='pdf') == 2
+    assert len(pypdf.PdfReader(io.BytesIO(sink.getvalue())).pages) == 2
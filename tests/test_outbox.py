@@ -0,0 +1,97 @@
+# Unit tests related to the durable outbox for purchases.
+
+import time
+
+import easypost
+import mock
+
+
+def bought_shipment(shipment_id):
+    return {'object': 'Shipment', 'id': shipment_id, 'postage_label': {'object': 'PostageLabel', 'id': 'pl_1'}}
+
+
+def test_outbox_runs_each_operation_once(tmpdir):
+    outbox = easypost.Outbox(str(tmpdir.join('outbox.db')), concurrency=2)
+    key = outbox.enqueue('shipment.buy', 'shp_1', idempotency_key='order-1', rate={'id': 'rate_1'})
+    assert outbox.enqueue('shipment.buy', 'shp_1', idempotency_key='order-1', rate={'id': 'rate_1'}) == key
+    assert outbox.counts() == {'pending': 1}
+
+    with mock.patch('easypost.Requestor.request', return_value=(bought_shipment('shp_1'), 'key')) as request:
+        assert outbox.run() == {'done': 1}
+        assert outbox.run() == {}
+    request.assert_called_once_with(
+        'post', '/shipments/shp_1/buy', {'rate': {'id': 'rate_1'}}, idempotency_key='order-1')
+
+    job = outbox.job('order-1')
+    assert job.state == 'done'
+    assert job.attempts == 1
+    assert isinstance(job.result, easypost.Shipment)
+    assert job.result.postage_label.id == 'pl_1'
+
+
+def test_outbox_does_not_rebuy_after_lost_response(tmpdir):
+    path = str(tmpdir.join('outbox.db'))
+    outbox = easypost.Outbox(path)
+    outbox.enqueue('shipment.buy', 'shp_1', idempotency_key='order-1')
+
+    with mock.patch('easypost.Requestor.request', side_effect=easypost.RequestTimeoutError('Request timed out')):
+        assert outbox.run() == {'retrying': 1}
+    assert outbox.job('order-1').error == 'Request timed out'
+
+    # the purchase went through despite the timeout; a fresh process only checks the shipment
+    outbox.close()
+    outbox = easypost.Outbox(path)
+    assert outbox.run() == {}
+    with mock.patch('easypost.Requestor.request', return_value=(bought_shipment('shp_1'), 'key')) as request, \
+            mock.patch('time.time', return_value=time.time() + 60):
+        assert outbox.run() == {'done': 1}
+    request.assert_called_once_with('get', '/shipments/shp_1', {})
+
+
+def test_outbox_records_permanent_failures(tmpdir):
+    outbox = easypost.Outbox(str(tmpdir.join('outbox.db')))
+    outbox.enqueue('pickup.buy', 'pickup_1', idempotency_key='pickup-1', carrier='USPS', service='NextDay')
+
+    error = easypost.InvalidRequestError('Invalid rate', http_status=422)
+    with mock.patch('easypost.Requestor.request', side_effect=error):
+        assert outbox.run() == {'failed': 1}
+    assert outbox.job('pickup-1').state == 'failed'
+    assert outbox.job('missing') is None
+
+
+def test_outbox_reclaims_running_jobs_after_their_lease(tmpdir):
+    path = str(tmpdir.join('outbox.db'))
+    outbox = easypost.Outbox(path, lease_timeout=60)
+    outbox.enqueue('shipment.buy', 'shp_1', idempotency_key='order-1')
+    # the first process claims the job and dies before finishing it
+    assert outbox._claim()[0] == 'order-1'
+    assert outbox._claim() is None
+
+    # another process sharing the outbox leaves it alone while the lease lasts
+    other = easypost.Outbox(path, lease_timeout=60)
+    with mock.patch('easypost.Requestor.request') as request:
+        assert other.run() == {}
+    assert request.call_count == 0
+    assert other.counts() == {'running': 1}
+
+    with mock.patch('easypost.Requestor.request', return_value=(bought_shipment('shp_1'), 'key')) as request, \
+            mock.patch('time.time', return_value=time.time() + 61):
+        assert other.run() == {'done': 1}
+    request.assert_called_once_with('get', '/shipments/shp_1', {})
+    assert other.job('order-1').attempts == 2
+
+    # the first process finishing late does not overwrite the newer outcome
+    outbox._finish('order-1', 0, 'failed', error='late')
+    assert other.job('order-1').state == 'done'
+
+
+def test_outbox_records_unexpected_exceptions(tmpdir):
+    outbox = easypost.Outbox(str(tmpdir.join('outbox.db')), concurrency=1)
+    outbox.enqueue('shipment.buy', 'shp_1', idempotency_key='order-1')
+    outbox.enqueue('shipment.buy', 'shp_2', idempotency_key='order-2')
+
+    responses = [ValueError('bad payload'), (bought_shipment('shp_2'), 'key')]
+    with mock.patch('easypost.Requestor.request', side_effect=responses):
+        assert outbox.run() == {'failed': 1, 'done': 1}
+    assert outbox.job('order-1').state == 'failed'
+    assert outbox.job('order-1').error == 'ValueError: bad payload'
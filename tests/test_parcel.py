@@ -1,6 +1,9 @@
 # Unit tests related to 'Parcel' (https://www.easypost.com/docs/api#parcels).
 
+import json
+
 import easypost
+import mock
 import pytest
 
 
@@ -19,3 +22,45 @@ def test_parcel_creation():
     assert parcel.width == 7.8
     assert parcel.weight == 21.2
     assert parcel.predefined_package == 'RegionalRateBoxA'
+
+
+@pytest.fixture
+def created_object_cache():
+    cache = easypost.CreatedObjectCache()
+    with mock.patch.object(easypost, 'created_object_cache', cache):
+        yield cache
+
+
+def test_parcel_creation_reuses_identical_parcels(created_object_cache):
+    body = json.dumps({'object': 'Parcel', 'id': 'prcl_123', 'weight': 21.2})
+    with mock.patch.object(easypost.Requestor, 'requests_request', return_value=(body, 200, {})) as request:
+        first = easypost.Parcel.create(weight=21.2, length=10)
+        second = easypost.Parcel.create(length=10, weight=21.2)
+        easypost.Parcel.create(weight=30, length=10)
+
+    assert request.call_count == 2
+    assert first.id == second.id == 'prcl_123'
+
+
+def test_nested_payloads_are_replaced_by_ids(created_object_cache):
+    parcel_body = json.dumps({'object': 'Parcel', 'id': 'prcl_123'})
+    item_body = json.dumps({'object': 'CustomsItem', 'id': 'cstitem_123'})
+    shipment_body = json.dumps({'object': 'Shipment', 'id': 'shp_123'})
+
+    with mock.patch.object(easypost.Requestor, 'requests_request', return_value=(parcel_body, 200, {})):
+        easypost.Parcel.create(weight=21.2)
+    with mock.patch.object(easypost.Requestor, 'requests_request', return_value=(item_body, 200, {})):
+        easypost.CustomsItem.create(description='T-shirt', quantity=1)
+
+    with mock.patch.object(easypost.Requestor, 'requests_request',
+                           return_value=(shipment_body, 200, {})) as request:
+        easypost.Shipment.create(
+            parcel={'weight': 21.2},
+            to_address={'street1': '388 Townsend St'},
+            customs_info={'customs_items': [{'description': 'T-shirt', 'quantity': 1}, {'description': 'Hat'}]},
+        )
+
+    params = request.call_args[0][3]
+    assert params['shipment']['parcel'] == {'id': 'prcl_123'}
+    assert params['shipment']['to_address'] == {'street1': '388 Townsend St'}
+    assert params['shipment']['customs_info']['customs_items'] == [{'id': 'cstitem_123'}, {'description': 'Hat'}]
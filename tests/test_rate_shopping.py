@@ -0,0 +1,86 @@
+# Unit tests related to rate shopping across many shipments (https://www.easypost.com/docs/api#rates).
+
+import datetime
+import json
+
+import easypost
+import mock
+
+
+def make_shipment(shipment_id, rates):
+    return easypost.convert_to_easypost_object({
+        'object': 'Shipment',
+        'id': shipment_id,
+        'rates': [
+            {
+                'object': 'Rate',
+                'id': 'rate_%s_%d' % (shipment_id, i),
+                'carrier': carrier,
+                'service': service,
+                'rate': amount,
+                'delivery_days': days,
+            }
+            for i, (carrier, service, amount, days) in enumerate(rates)
+        ],
+    }, None)
+
+
+SHIPMENTS = [
+    make_shipment('shp_1', [
+        ('USPS', 'Priority', '7.68', 2),
+        ('USPS', 'First', '3.10', 5),
+        ('UPS', 'NextDayAir', '42.00', 1),
+    ]),
+    make_shipment('shp_2', [
+        ('USPS', 'Priority', '8.10', 3),
+        ('FedEx', 'FEDEX_GROUND', '6.95', 4),
+    ]),
+]
+
+
+def test_rate_index_cheapest_matches_lowest_rate():
+    index = easypost.RateIndex(SHIPMENTS)
+
+    assert [rate.id for rate in index.cheapest()] == [shipment.lowest_rate().id for shipment in SHIPMENTS]
+    assert [rate.id for rate in index.cheapest(carriers='usps')] == ['rate_shp_1_1', 'rate_shp_2_0']
+    ups_rates = index.cheapest(carriers=['UPS'], services=['nextdayair'])
+    assert ups_rates[0].id == 'rate_shp_1_2'
+    assert ups_rates[1] is None
+
+
+def test_rate_index_fastest_within_budget():
+    index = easypost.RateIndex(SHIPMENTS)
+
+    assert [rate.id for rate in index.fastest()] == ['rate_shp_1_2', 'rate_shp_2_0']
+    assert [rate.id for rate in index.fastest(max_amount='10.00')] == ['rate_shp_1_0', 'rate_shp_2_0']
+    assert [rate.id for rate in index.fastest(max_amount=7)] == ['rate_shp_1_1', 'rate_shp_2_1']
+
+
+def test_rate_index_delivery_date_constraint():
+    today = datetime.date(2020, 5, 11)
+    index = easypost.RateIndex(SHIPMENTS, today=today)
+
+    chosen = index.cheapest(deliver_by=today + datetime.timedelta(days=3))
+    assert [rate.id for rate in chosen] == ['rate_shp_1_0', 'rate_shp_2_0']
+    assert len(index.for_carrier_service('USPS', 'Priority')) == 2
+
+
+def test_rate_shopper_creates_shipments_concurrently():
+    bodies = {
+        'a': json.dumps(SHIPMENTS[0].to_dict()),
+        'b': json.dumps(SHIPMENTS[1].to_dict()),
+    }
+
+    def fake_request(method, abs_url, headers, params, request_timeout=None):
+        reference = params['shipment']['reference']
+        if reference == 'bad':
+            return json.dumps({'error': {'message': 'Invalid address'}}), 422, {}
+        return bodies[reference], 201, {}
+
+    with mock.patch.object(easypost.Requestor, 'requests_request', side_effect=fake_request):
+        choices = easypost.RateShopper(concurrency=3).shop(
+            [{'reference': 'a'}, {'reference': 'bad'}, {'reference': 'b'}], rule='cheapest')
+
+    assert [choice.shipment.id if choice.shipment else None for choice in choices] == ['shp_1', None, 'shp_2']
+    assert [choice.rate.id if choice.rate else None for choice in choices] == ['rate_shp_1_1', None, 'rate_shp_2_1']
+    assert choices[1].error.http_status == 422
@@ -0,0 +1,110 @@
+# Unit tests related to vectorized rate selection across many shipments (https://www.easypost.com/docs/api#rates).
+
+import random
+import time
+
+import easypost
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+
+CARRIER_SERVICES = [
+    ('USPS', 'Priority'),
+    ('USPS', 'First'),
+    ('UPS', 'Ground'),
+    ('UPS', 'NextDayAir'),
+    ('FedEx', 'FEDEX_GROUND'),
+]
+
+
+def make_shipments(count, seed=0):
+    rng = random.Random(seed)
+    shipments = []
+    for i in range(count):
+        rates = []
+        for j, (carrier, service) in enumerate(CARRIER_SERVICES):
+            if rng.random() < 0.2:
+                continue
+            rates.append({
+                'object': 'Rate',
+                'id': 'rate_%d_%d' % (i, j),
+                'carrier': carrier,
+                'service': service,
+                'rate': '%.2f' % rng.uniform(3, 60),
+                'delivery_days': rng.choice([1, 2, 3, 5, None]),
+            })
+        shipments.append(easypost.convert_to_easypost_object(
+            {'object': 'Shipment', 'id': 'shp_%d' % i, 'rates': rates}, None))
+    return shipments
+
+
+def loop_lowest(shipments, **filters):
+    chosen = []
+    for shipment in shipments:
+        try:
+            chosen.append(shipment.lowest_rate(**filters))
+        except easypost.Error:
+            chosen.append(None)
+    return chosen
+
+
+def ids(rates):
+    return [rate.id if rate is not None else None for rate in rates]
+
+
+def test_rate_table_matches_lowest_rate():
+    shipments = make_shipments(200)
+    table = easypost.RateTable(shipments)
+
+    assert len(table) == sum(len(shipment.rates) for shipment in shipments)
+    assert ids(table.lowest()) == ids(loop_lowest(shipments))
+    assert ids(table.lowest(carriers='usps', services=['priority'])) == \
+        ids(loop_lowest(shipments, carriers='usps', services=['priority']))
+
+
+def test_rate_table_fastest_within_budget():
+    shipments = make_shipments(50, seed=1)
+    table = easypost.RateTable(shipments)
+
+    for shipment, rate in zip(shipments, table.fastest(max_amount=20)):
+        candidates = [r for r in shipment.rates if float(r.rate) <= 20 and r.delivery_days is not None]
+        if not candidates:
+            assert rate is None
+            continue
+        best = min(candidates, key=lambda r: (r.delivery_days, float(r.rate)))
+        assert rate.id == best.id
+
+
+QUERIES = [
+    {'carriers': ['usps', 'ups']},
+    {},
+    {'services': 'ground'},
+    {'carriers': 'fedex'},
+    {'carriers': 'usps', 'services': 'priority'},
+]
+
+
+@pytest.mark.slow
+def test_rate_table_benchmark(record_property):
+    # building the table costs about as much as one per-shipment pass, so the comparison is over
+    # several selections on the same shipments, with the build counted
+    shipments = make_shipments(10000)
+
+    start = time.time()
+    expected = [loop_lowest(shipments, **query) for query in QUERIES]
+    loop_seconds = time.time() - start
+
+    start = time.time()
+    table = easypost.RateTable(shipments)
+    build_seconds = time.time() - start
+
+    start = time.time()
+    chosen = [table.lowest(**query) for query in QUERIES]
+    select_seconds = time.time() - start
+
+    assert [ids(rates) for rates in chosen] == [ids(rates) for rates in expected]
+    record_property('loop_seconds', loop_seconds)
+    record_property('build_seconds', build_seconds)
+    record_property('select_seconds', select_seconds)
+    assert build_seconds + select_seconds < loop_seconds
@@ -1,8 +1,12 @@
 # Unit tests related to 'Report's (https://www.easypost.com/docs/api.html#reports).
 
+import json
+from datetime import date
+
 import easypost
+import mock
 import pytest
-from datetime import date
+from six.moves import BaseHTTPServer
 
 # Use the current date to avoid needing to define a new date manually on each test
 today = date.today()
@@ -29,3 +33,62 @@ def test_shipment_report():
     reports = easypost.Report.all(type="shipment")
     assert len(reports["reports"])
     assert reports["reports"][0].id == report.id == report2.id
+
+
+REPORT_CSV = (
+    b'id,reference,note\r\n'
+    b'shp_1,order-1,plain\r\n'
+    b'shp_2,order-2,"spans\r\ntwo lines"\r\n'
+)
+
+
+class ReportFileHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(len(REPORT_CSV)))
+        self.end_headers()
+        self.wfile.write(REPORT_CSV)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def report_file_url(local_server):
+    return local_server(ReportFileHandler) + '/shprep_123.csv'
+
+
+def test_stream_report_waits_and_streams_rows(report_file_url):
+    def report_body(status, url=None):
+        return json.dumps({'object': 'ShipmentReport', 'id': 'shprep_123', 'status': status, 'url': url}), 200, {}
+
+    responses = [report_body('new'), report_body('new'), report_body('available', report_file_url)]
+    with mock.patch.object(easypost.Requestor, 'requests_request', side_effect=responses) as request:
+        rows = easypost.stream_report('shipment', start_date='2020-05-01', end_date='2020-05-31',
+                                      initial_interval=0.01)
+
+        assert request.call_count == 3
+        assert request.call_args_list[0][0][:2] == ('post', easypost.api_base + '/reports/shipment')
+
+    assert list(rows) == [
+        {'id': 'shp_1', 'reference': 'order-1', 'note': 'plain'},
+        {'id': 'shp_2', 'reference': 'order-2', 'note': 'spans\r\ntwo lines'},
+    ]
+
+
+def test_stream_report_failed():
+    body = json.dumps({'object': 'ShipmentReport', 'id': 'shprep_123', 'status': 'failed'})
+    with mock.patch.object(easypost.Requestor, 'requests_request', return_value=(body, 200, {})):
+        with pytest.raises(easypost.Error) as caught_exception:
+            easypost.stream_report('shipment', start_date='2020-05-01', end_date='2020-05-31')
+
+    assert 'failed' in str(caught_exception.value)
+
+
+def test_report_rows_into_columns(report_file_url):
+    report = easypost.Report.construct_from({'id': 'shprep_123', 'status': 'available', 'url': report_file_url})
+
+    columns = easypost.to_columns(report.iter_rows(), ['id', 'reference'])
+
+    assert columns == {'id': ['shp_1', 'shp_2'], 'reference': ['order-1', 'order-2']}
@@ -0,0 +1,500 @@
+# Unit tests related to the 'Requestor', which every resource sends its API calls through.
+
+import json
+import threading
+import time
+
+import easypost
+import mock
+import pytest
+import requests
+
+
+CARRIER_TYPES_BODY = json.dumps([{'object': 'CarrierType', 'type': 'UpsAccount'}])
+
+
+def test_coalesce_identical_gets():
+    calls = []
+
+    def slow_request(method, abs_url, headers, params, request_timeout=None):
+        calls.append(abs_url)
+        time.sleep(0.2)
+        return CARRIER_TYPES_BODY, 200, {}
+
+    results = []
+
+    def worker():
+        results.append(easypost.CarrierAccount.types())
+
+    with mock.patch.object(easypost, 'coalesce_requests', True), \
+            mock.patch.object(easypost.Requestor, 'requests_request', side_effect=slow_request):
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 5
+    assert all(carriers[0].type == 'UpsAccount' for carriers in results)
+    # each caller still gets its own objects
+    assert len(set(id(carriers[0]) for carriers in results)) == 5
+
+
+def test_coalesce_does_not_merge_different_params_or_posts():
+    calls = []
+
+    def fake_request(method, abs_url, headers, params, request_timeout=None):
+        calls.append((method, abs_url))
+        return json.dumps({'object': 'Shipment', 'id': 'shp_123'}), 200, {}
+
+    with mock.patch.object(easypost, 'coalesce_requests', True), \
+            mock.patch.object(easypost.Requestor, 'requests_request', side_effect=fake_request):
+        easypost.Shipment.all(page_size=1)
+        easypost.Shipment.all(page_size=2)
+        easypost.Shipment.create(reference='a')
+        easypost.Shipment.create(reference='a')
+
+    assert len(calls) == 4
+
+
+def test_coalesce_fans_out_errors():
+    def failing_request(method, abs_url, headers, params, request_timeout=None):
+        time.sleep(0.2)
+        return json.dumps({'error': {'message': 'boom'}}), 500, {}
+
+    errors = []
+
+    def worker():
+        try:
+            easypost.CarrierAccount.types()
+        except easypost.Error as e:
+            errors.append(e)
+
+    with mock.patch.object(easypost, 'coalesce_requests', True), \
+            mock.patch.object(easypost.Requestor, 'requests_request', side_effect=failing_request) as request:
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert request.call_count == 1
+    assert len(errors) == 3
+    assert all(e.http_status == 500 for e in errors)
+
+
+def test_retries_reuse_idempotency_key():
+    responses = [
+        easypost.APIConnectionError('Connection reset', original_exception=IOError('reset')),
+        (json.dumps({'error': {'message': 'Internal error'}}), 500, {}),
+        (json.dumps({'object': 'Shipment', 'id': 'shp_123', 'tracking_code': 'EZ1'}), 200, {}),
+    ]
+    keys = []
+
+    def flaky_request(method, abs_url, headers, params, request_timeout=None):
+        keys.append(headers.get('Idempotency-Key'))
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    shipment = easypost.Shipment('shp_123')
+    with mock.patch.object(easypost, 'max_network_retries', 2), \
+            mock.patch.object(easypost, 'retry_backoff', 0), \
+            mock.patch.object(easypost.Requestor, 'requests_request', side_effect=flaky_request):
+        shipment.buy(rate={'id': 'rate_123'})
+
+    assert shipment.tracking_code == 'EZ1'
+    assert len(keys) == 3
+    assert keys[0] is not None and len(set(keys)) == 1
+
+    responses.append((json.dumps({'object': 'Shipment', 'id': 'shp_123'}), 200, {}))
+    with mock.patch.object(easypost.Requestor, 'requests_request', side_effect=flaky_request):
+        shipment.buy(rate={'id': 'rate_123'}, idempotency_key='order-1')
+    assert keys[-1] == 'order-1'
+
+
+def test_writes_without_idempotency_key_are_not_retried():
+    calls = []
+
+    def failing_request(method, abs_url, headers, params, request_timeout=None):
+        calls.append(method)
+        return json.dumps({'error': {'message': 'Internal error'}}), 500, {}
+
+    with mock.patch.object(easypost, 'max_network_retries', 3), \
+            mock.patch.object(easypost, 'retry_backoff', 0), \
+            mock.patch.object(easypost.Requestor, 'requests_request', side_effect=failing_request):
+        with pytest.raises(easypost.Error):
+            easypost.Shipment.create(reference='a')
+        with pytest.raises(easypost.Error):
+            easypost.Shipment.retrieve('shp_123')
+
+    assert calls == ['post', 'get', 'get', 'get', 'get']
+
+
+def test_endpoint_and_per_call_timeouts():
+    response = mock.Mock(text=json.dumps({'object': 'Tracker', 'id': 'trk_123'}), status_code=200, headers={})
+    session = mock.Mock()
+    session.request.return_value = response
+
+    with mock.patch.object(easypost, 'requests_session', session), \
+            mock.patch.object(easypost, 'endpoint_timeouts', [(r'^/trackers/', (2, 5))]):
+        easypost.Tracker.retrieve('trk_123')
+        assert session.request.call_args[1]['timeout'] == (2, 5)
+
+        easypost.Shipment.retrieve('shp_123')
+        assert session.request.call_args[1]['timeout'] == (easypost.timeout, easypost.timeout)
+
+        with easypost.request_options(timeout=(1, 3)):
+            easypost.Tracker.retrieve('trk_123')
+        assert session.request.call_args[1]['timeout'] == (1, 3)
+
+        with easypost.request_options(deadline=0.5):
+            easypost.Tracker.retrieve('trk_123')
+            connect_timeout, read_timeout = session.request.call_args[1]['timeout']
+            assert connect_timeout <= 0.5 and read_timeout <= 0.5
+
+        with pytest.raises(easypost.Error):
+            with easypost.request_options(timeout=easypost._max_timeout + 1):
+                easypost.Tracker.retrieve('trk_123')
+
+
+def test_deadline_is_shared_by_retries():
+    calls = []
+
+    def failing_request(method, abs_url, headers, params, request_timeout=None):
+        calls.append(time.time())
+        return json.dumps({'error': {'message': 'Internal error'}}), 503, {}
+
+    with mock.patch.object(easypost, 'max_network_retries', 10), \
+            mock.patch.object(easypost, 'retry_backoff', 0.1), \
+            mock.patch.object(easypost.Requestor, 'requests_request', side_effect=failing_request):
+        with easypost.request_options(deadline=0.5):
+            with pytest.raises(easypost.Error):
+                easypost.Shipment.retrieve('shp_123')
+
+            # the budget is spent, so later calls in the block fail without being sent
+            time.sleep(0.5)
+            count = len(calls)
+            with pytest.raises(easypost.DeadlineExceededError) as excinfo:
+                easypost.Shipment.retrieve('shp_123')
+            assert len(calls) == count
+            assert isinstance(excinfo.value, easypost.RequestTimeoutError)
+            assert not excinfo.value.retryable
+
+    assert 1 < len(calls) < 11
+    assert calls[-1] - calls[0] < 0.5
+
+
+def test_hedged_get_takes_the_faster_response():
+    calls = []
+
+    def request(method, abs_url, headers, params, request_timeout=None):
+        calls.append(abs_url)
+        if len(calls) == 1:
+            time.sleep(1)
+        return json.dumps({'object': 'Shipment', 'id': 'shp_123', 'attempt': len(calls)}), 200, {}
+
+    policy = easypost.HedgePolicy(delay=0.05, max_extra_load=1)
+    with mock.patch.object(easypost, 'hedge_policy', policy), \
+            mock.patch.object(easypost.Requestor, 'requests_request', side_effect=request):
+        started = time.time()
+        shipment = easypost.Shipment.retrieve('shp_123')
+        assert time.time() - started < 0.5
+        assert shipment.attempt == 2
+
+        # writes are never hedged
+        easypost.Shipment.create(reference='a')
+
+    assert policy.stats['hedged'] == 1
+    assert policy.stats['hedge_wins'] == 1
+    assert len(calls) == 3
+
+
+def test_hedging_respects_load_cap_and_warm_up():
+    def request(method, abs_url, headers, params, request_timeout=None):
+        time.sleep(0.02)
+        return json.dumps({'object': 'Shipment', 'id': 'shp_123'}), 200, {}
+
+    policy = easypost.HedgePolicy(percentile=50, max_extra_load=0.1, min_samples=5)
+    with mock.patch.object(easypost, 'hedge_policy', policy), \
+            mock.patch.object(easypost.Requestor, 'requests_request', side_effect=request):
+        for _ in range(5):
+            easypost.Shipment.retrieve('shp_123')
+        # no latency percentile until enough samples were recorded
+        assert policy.stats['hedged'] == 0
+        assert policy.delay_for('GET /shipments/:id') >= 0.02
+
+        for _ in range(15):
+            easypost.Shipment.retrieve('shp_123')
+
+    assert policy.stats['calls'] == 20
+    assert policy.stats['hedged'] <= 2
+
+
+def test_endpoint_group_normalizes_ids():
+    assert easypost._endpoint_group('get', '/shipments/shp_123/rates') == 'GET /shipments/:id/rates'
+    assert easypost._endpoint_group('post', '/batches/create_and_buy') == 'POST /batches/create_and_buy'
+    assert easypost._endpoint_group('get', '/trackers?page_size=5') == 'GET /trackers'
+    assert easypost._endpoint_group('get', '/users/user_1/api_keys') == 'GET /users/:id/api_keys'
+    assert easypost._endpoint_group('get', '/reports/shipment/shprep_1') == 'GET /reports/shipment/:id'
+    # resource names shaped like ids are kept
+    for path in ('/carrier_types', '/carrier_accounts', '/api_keys', '/trackers/all_updated', '/scan_forms',
+                 '/customs_items', '/customs_infos'):
+        assert easypost._endpoint_group('get', path) == 'GET ' + path
+
+
+def test_latency_tracker_derives_timeouts():
+    latencies = easypost.LatencyTracker(min_samples=10, timeout_percentile=99, timeout_factor=2, min_timeout=0.5)
+    for _ in range(100):
+        latencies.record('GET /trackers/:id', 0.1)
+    latencies.record('GET /trackers/:id', 2)
+    latencies.record('GET /shipments/:id', 0.1)
+
+    assert 0.5 <= latencies.timeout_for('GET /trackers/:id') < 0.5 * 1.1
+    # not enough history yet
+    assert latencies.timeout_for('GET /shipments/:id') is None
+    assert latencies.snapshot()['GET /trackers/:id']['count'] == 101
+
+    # requests record their latency, and endpoints with enough history get a derived read timeout
+    response = mock.Mock(text=json.dumps({'object': 'Tracker', 'id': 'trk_123'}), status_code=200, headers={})
+    session = mock.Mock()
+    session.request.return_value = response
+    with mock.patch.object(easypost, 'latency_stats', latencies), \
+            mock.patch.object(easypost, 'requests_session', session):
+        easypost.Tracker.retrieve('trk_123')
+        connect_timeout, read_timeout = session.request.call_args[1]['timeout']
+        assert connect_timeout == easypost.timeout
+        assert read_timeout < 1
+
+        easypost.Shipment.retrieve('shp_123')
+        assert session.request.call_args[1]['timeout'] == (easypost.timeout, easypost.timeout)
+
+    assert latencies.snapshot()['GET /trackers/:id']['count'] == 102
+
+
+def test_latency_tracker_records_timed_out_requests():
+    latencies = easypost.LatencyTracker(min_samples=1)
+    timeout = easypost.RequestTimeoutError('Request timed out')
+    with mock.patch.object(easypost, 'latency_stats', latencies), \
+            mock.patch.object(easypost.Requestor, 'requests_request', side_effect=timeout), \
+            easypost.request_options(timeout=(1, 3)):
+        with pytest.raises(easypost.RequestTimeoutError):
+            easypost.Tracker.retrieve('trk_123')
+
+    # counted as taking the whole read timeout, although the mocked transport failed at once
+    snapshot = latencies.snapshot()['GET /trackers/:id']
+    assert snapshot['count'] == 1
+    assert latencies.percentile('GET /trackers/:id', 50) >= 3
+
+
+def test_concurrent_attempts_keep_their_own_timeouts():
+    # hedged attempts run on one requestor in separate threads
+    requestor = easypost.Requestor('key')
+    both_started = threading.Barrier(2) if hasattr(threading, 'Barrier') else None
+    seen = []
+
+    def request(method, abs_url, headers, params, request_timeout=None):
+        if both_started is not None:
+            both_started.wait(timeout=5)
+        seen.append((abs_url.rsplit('/', 1)[-1], request_timeout))
+        return json.dumps({'object': 'Tracker'}), 200, {}
+
+    def send(tracker_id, read_timeout):
+        with easypost.request_options(timeout=(1, read_timeout)):
+            requestor._request_raw('get', '/trackers/%s' % tracker_id)
+
+    with mock.patch.object(easypost.Requestor, 'requests_request', side_effect=request):
+        threads = [threading.Thread(target=send, args=args) for args in (('trk_1', 5), ('trk_2', 7))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert sorted(seen) == [('trk_1', (1, 5)), ('trk_2', (1, 7))]
+
+
+def test_latency_histogram_follows_shifting_latencies():
+    histogram = easypost.LatencyHistogram(decay_every=100)
+    for _ in range(100):
+        histogram.record(0.1)
+    for _ in range(400):
+        histogram.record(1)
+    assert histogram.percentile(50) >= 1
+
+
+def test_circuit_breaker_opens_fails_fast_and_probes():
+    statuses = [503] * 5 + [200]
+    calls = []
+
+    def request(method, abs_url, headers, params, request_timeout=None):
+        calls.append(abs_url)
+        status = statuses.pop(0)
+        body = {'object': 'Shipment', 'id': 'shp_123'} if status == 200 else {'error': {'message': 'Unavailable'}}
+        return json.dumps(body), status, {}
+
+    breaker = easypost.CircuitBreaker(failure_threshold=0.5, min_requests=4, reset_timeout=0.2)
+    with mock.patch.object(easypost, 'circuit_breaker', breaker), \
+            mock.patch.object(easypost.Requestor, 'requests_request', side_effect=request):
+        for _ in range(4):
+            with pytest.raises(easypost.Error):
+                easypost.Shipment.retrieve('shp_123')
+        key = ('...' + easypost.api_key[-4:], 'GET /shipments/:id')
+        assert breaker.states()[key]['state'] == 'open'
+
+        with pytest.raises(easypost.CircuitOpenError) as excinfo:
+            easypost.Shipment.retrieve('shp_456')
+        assert excinfo.value.retry_after <= 0.2
+        assert len(calls) == 4
+
+        # other endpoint groups are unaffected
+        with pytest.raises(easypost.Error):
+            easypost.Tracker.create(tracking_code='EZ1000000001')
+
+        time.sleep(0.2)
+        assert easypost.Shipment.retrieve('shp_123').id == 'shp_123'
+        assert breaker.states()[key]['state'] == 'closed'
+
+
+def test_circuit_breaker_ignores_requests_past_their_deadline():
+    breaker = easypost.CircuitBreaker(min_requests=1)
+    with mock.patch.object(easypost, 'circuit_breaker', breaker), \
+            mock.patch.object(easypost.Requestor, 'requests_request') as request:
+        with easypost.request_options(deadline=0):
+            with pytest.raises(easypost.DeadlineExceededError):
+                easypost.Shipment.retrieve('shp_123')
+
+    assert request.call_count == 0
+    # never sent, so it counts neither as a success nor as a failure
+    state = breaker.states()[('...' + easypost.api_key[-4:], 'GET /shipments/:id')]
+    assert state['state'] == 'closed'
+    assert state['requests'] == 0
+
+
+def test_circuit_breaker_ignores_outcomes_from_before_half_open():
+    breaker = easypost.CircuitBreaker(min_requests=2, reset_timeout=10)
+    group = 'GET /shipments/:id'
+    with mock.patch('easypost.circuit.time.time', return_value=100):
+        slow = breaker.before('key', group)
+        for _ in range(2):
+            breaker.record('key', group, True, breaker.before('key', group))
+        assert breaker.states()[('...key', group)]['state'] == 'open'
+
+    with mock.patch('easypost.circuit.time.time', return_value=110):
+        probe = breaker.before('key', group)
+        # a request sent while the circuit was closed answers late; it neither closes the circuit
+        # nor frees the probe's slot
+        breaker.record('key', group, False, slow)
+        assert breaker.states()[('...key', group)]['state'] == 'half_open'
+        with pytest.raises(easypost.CircuitOpenError):
+            breaker.before('key', group)
+
+        breaker.record('key', group, False, probe)
+        assert breaker.states()[('...key', group)]['state'] == 'closed'
+        # nor does it count against the closed circuit
+        breaker.record('key', group, True, slow)
+        assert breaker.states()[('...key', group)]['failures'] == 0
+
+
+def test_scheduler_reserves_capacity_for_interactive_requests():
+    release = threading.Event()
+    sent = []
+
+    def request(method, abs_url, headers, params, request_timeout=None):
+        sent.append(abs_url)
+        if abs_url.endswith('/trackers/trk_1'):
+            release.wait(5)
+        return json.dumps({'object': 'Tracker', 'id': 'trk_1'}), 200, {}
+
+    def bulk_retrieve(tracker_id):
+        with easypost.request_options(priority='bulk'):
+            easypost.Tracker.retrieve(tracker_id)
+
+    scheduler = easypost.RequestScheduler(max_concurrent=2, reserved=1)
+    with mock.patch.object(easypost, 'request_scheduler', scheduler), \
+            mock.patch.object(easypost.Requestor, 'requests_request', side_effect=request):
+        first = threading.Thread(target=bulk_retrieve, args=('trk_1',))
+        first.start()
+        while not sent:
+            time.sleep(0.01)
+        second = threading.Thread(target=bulk_retrieve, args=('trk_2',))
+        second.start()
+        while not scheduler.queued()['bulk']:
+            time.sleep(0.01)
+
+        # the bulk backlog does not hold up checkout
+        easypost.Shipment.retrieve('shp_123')
+        assert len(sent) == 2 and sent[1].endswith('/shipments/shp_123')
+
+        with easypost.request_options(priority='bulk', deadline=0.1):
+            with pytest.raises(easypost.DeadlineExceededError):
+                easypost.Tracker.retrieve('trk_3')
+
+        release.set()
+        first.join()
+        second.join()
+
+    assert sent[2].endswith('/trackers/trk_2')
+    assert scheduler.stats['bulk_sent'] == 2
+    assert scheduler.stats['bulk_queued'] == 2
+    assert scheduler.stats['bulk_expired'] == 1
+    assert scheduler.in_flight == {'interactive': 0, 'bulk': 0}
+
+
+def test_api_errors_are_typed():
+    cases = [
+        (400, easypost.InvalidRequestError, False),
+        (402, easypost.PaymentError, False),
+        (404, easypost.NotFoundError, False),
+        (422, easypost.InvalidRequestError, False),
+        (429, easypost.RateLimitError, True),
+        (502, easypost.ServerError, True),
+        (401, easypost.Error, False),
+    ]
+    for status, error_class, retryable in cases:
+        body = json.dumps({'error': {'message': 'Failed'}})
+        with mock.patch.object(easypost.Requestor, 'requests_request', return_value=(body, status, {})):
+            with pytest.raises(error_class) as excinfo:
+                easypost.Shipment.retrieve('shp_123')
+        assert type(excinfo.value) is error_class
+        assert excinfo.value.http_status == status
+        assert excinfo.value.retryable is retryable
+
+
+def test_rate_limit_error_parses_retry_after():
+    body = json.dumps({'error': {'message': 'Slow down'}})
+    with mock.patch.object(easypost.Requestor, 'requests_request', return_value=(body, 429, {'retry-after': '3'})):
+        with pytest.raises(easypost.RateLimitError) as excinfo:
+            easypost.Shipment.retrieve('shp_123')
+    assert excinfo.value.retry_after == 3
+
+    error = easypost.ServerError('Unavailable', 503, http_headers={'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+    assert error.retry_after == 0
+    assert easypost.Error('Failed').retry_after is None
+
+
+def test_transport_failures_are_typed_and_retried():
+    session = mock.Mock()
+    session.request.side_effect = requests.exceptions.ReadTimeout('read timed out')
+    with mock.patch.object(easypost, 'requests_session', session), \
+            mock.patch.object(easypost, 'max_network_retries', 1), \
+            mock.patch.object(easypost, 'retry_backoff', 0):
+        with pytest.raises(easypost.RequestTimeoutError) as excinfo:
+            easypost.Shipment.retrieve('shp_123')
+    assert excinfo.value.retryable
+    assert isinstance(excinfo.value, easypost.APIConnectionError)
+    assert session.request.call_count == 2
+
+
+def test_retries_wait_for_retry_after():
+    responses = [
+        (json.dumps({'error': {'message': 'Slow down'}}), 429, {'Retry-After': '0.2'}),
+        (json.dumps({'object': 'Shipment', 'id': 'shp_123'}), 200, {}),
+    ]
+    with mock.patch.object(easypost, 'max_network_retries', 1), \
+            mock.patch.object(easypost, 'retry_backoff', 0), \
+            mock.patch.object(easypost.Requestor, 'requests_request', side_effect=responses):
+        started = time.time()
+        assert easypost.Shipment.retrieve('shp_123').id == 'shp_123'
+        assert time.time() - started >= 0.2
@@ -1,8 +1,10 @@
 # Unit tests related to 'Shipments' (https://www.easypost.com/docs/api#shipments).
 
+import json
 import time
 
 import easypost
+import mock
 import pytest
 
 
@@ -175,3 +177,112 @@ def test_rerate(vcr):
     new_rate_id = shipment.rates[0].id
     assert new_rate_id is not None
     assert new_rate_id != rate_id
+
+
+def shipment_payload(shipment_id, created_at, reference=None, name='Jack Sparrow', status='delivered'):
+    return {
+        'object': 'Shipment',
+        'id': shipment_id,
+        'reference': reference,
+        'status': status,
+        'tracking_code': 'EZ%s' % shipment_id,
+        'created_at': created_at,
+        'to_address': {'object': 'Address', 'name': name},
+    }
+
+
+def test_shipment_mirror_incremental_sync(tmpdir):
+    mirror = easypost.ShipmentMirror(str(tmpdir.join('shipments.db')))
+    pages = [
+        {'shipments': [shipment_payload('shp_3', '2021-01-03'), shipment_payload('shp_2', '2021-01-02')],
+         'has_more': True},
+        {'shipments': [shipment_payload('shp_1', '2021-01-01', reference='order-1', name='Elizabeth Swan')],
+         'has_more': False},
+    ]
+    with mock.patch('easypost.Requestor.request', side_effect=[(page, 'key') for page in pages]) as request:
+        assert mirror.sync(page_size=2) == 3
+    assert request.call_args[0][2]['before_id'] == 'shp_2'
+    assert len(mirror) == 3
+
+    # the next sync only pages through shipments created since the newest one of the completed sync
+    page = {'shipments': [shipment_payload('shp_4', '2021-01-04', status='in_transit'),
+                          shipment_payload('shp_3', '2021-01-03')],
+            'has_more': False}
+    with mock.patch('easypost.Requestor.request', return_value=(page, 'key')) as request:
+        assert mirror.sync() == 2
+    assert request.call_count == 1
+    assert request.call_args[0][2]['start_datetime'] == '2021-01-03'
+
+    shipment = next(mirror.find(reference='order-1'))
+    assert isinstance(shipment, easypost.Shipment)
+    assert shipment.to_address.name == 'Elizabeth Swan'
+    assert [s.id for s in mirror.find(recipient='sparrow')] == ['shp_4', 'shp_3', 'shp_2']
+    assert [s.id for s in mirror.find(status='in_transit')] == ['shp_4']
+    assert [s.id for s in mirror.find(created_after='2021-01-02', created_before='2021-01-04')] == ['shp_3', 'shp_2']
+    assert mirror.get('shp_1').tracking_code == 'EZshp_1'
+    assert mirror.get('shp_missing') is None
+
+
+def test_shipment_mirror_resumes_interrupted_sync(tmpdir):
+    path = str(tmpdir.join('shipments.db'))
+    mirror = easypost.ShipmentMirror(path)
+    shipments = [shipment_payload('shp_%d' % i, '2021-01-0%d' % i) for i in range(5, 0, -1)]
+    pages = [
+        {'shipments': shipments[0:2], 'has_more': True},
+        {'shipments': shipments[2:4], 'has_more': True},
+        {'shipments': shipments[4:], 'has_more': False},
+    ]
+    responses = [(pages[0], 'key'), easypost.APIConnectionError('Unexpected error communicating with EasyPost')]
+    with mock.patch('easypost.Requestor.request', side_effect=responses):
+        with pytest.raises(easypost.APIConnectionError):
+            mirror.sync(page_size=2)
+    assert len(mirror) == 2
+    assert mirror.synced_until is None
+
+    # a fresh process picks the interrupted sync up after the last stored page, instead of stopping at the
+    # shipments that page already mirrored
+    mirror.close()
+    mirror = easypost.ShipmentMirror(path)
+    sent = []
+
+    def fake_request(method, url, params):
+        sent.append(dict(params))
+        return pages[len(sent)], 'key'
+
+    with mock.patch('easypost.Requestor.request', side_effect=fake_request):
+        assert mirror.sync(page_size=2) == 3
+    assert [params['before_id'] for params in sent] == ['shp_4', 'shp_2']
+    assert len(mirror) == 5
+    assert mirror.synced_until == '2021-01-05'
+
+    empty = {'shipments': [], 'has_more': False}
+    with mock.patch('easypost.Requestor.request', return_value=(empty, 'key')) as request:
+        assert mirror.sync(page_size=2) == 0
+    assert request.call_args[0][2]['start_datetime'] == '2021-01-05'
+    assert 'before_id' not in request.call_args[0][2]
+
+
+def test_shipment_mirror_applies_tracker_events(tmpdir):
+    mirror = easypost.ShipmentMirror(str(tmpdir.join('shipments.db')))
+    mirror.upsert([shipment_payload('shp_1', '2021-01-01', status='pre_transit')])
+
+    def tracker_event(status, updated_at, shipment_id='shp_1'):
+        return easypost.Event.receive(json.dumps({
+            'object': 'Event',
+            'description': 'tracker.updated',
+            'result': {'object': 'Tracker', 'id': 'trk_1', 'shipment_id': shipment_id, 'status': status,
+                       'tracking_code': '9400100000000000000000', 'updated_at': updated_at},
+        }))
+
+    assert mirror.handle_event(tracker_event('in_transit', '2021-01-02T00:00:00Z'))
+    assert [s.id for s in mirror.find(status='in_transit')] == ['shp_1']
+    assert [s.id for s in mirror.find(tracking_code='9400100000000000000000')] == ['shp_1']
+    assert mirror.get('shp_1').tracker.status == 'in_transit'
+
+    # a late, older delivery does not roll the status back
+    assert mirror.handle_event(tracker_event('pre_transit', '2021-01-01T00:00:00Z'))
+    assert mirror.get('shp_1').status == 'in_transit'
+
+    # trackers of shipments that are not mirrored are ignored
+    assert not mirror.handle_event(tracker_event('delivered', '2021-01-03T00:00:00Z', shipment_id='shp_2'))
+    assert len(mirror) == 1
@@ -1,6 +1,9 @@
 # Unit tests related to 'Trackers' (https://www.easypost.com/docs/api#tracking).
 
+import json
+
 import easypost
+import mock
 import pytest
 
 
@@ -66,3 +69,89 @@ def test_tracker_interactions(per_run_unique):
     assert len(trackers2["trackers"]) == 1             # Should be 1
     assert trackers2["has_more"] is False              # Should be false
     assert trackers2["trackers"][0].id == tracker3.id  # Should be the same as the id for tracker3
+
+
+def tracker_payload(tracker_id, status, details, updated_at, tracking_code='EZ1000000001', shipment_id='shp_1'):
+    return {
+        'object': 'Tracker',
+        'id': tracker_id,
+        'tracking_code': tracking_code,
+        'shipment_id': shipment_id,
+        'status': status,
+        'updated_at': updated_at,
+        'tracking_details': [
+            {'object': 'TrackingDetail', 'status': detail, 'message': detail, 'datetime': '2021-01-0%dT00:00:00Z' % i}
+            for i, detail in enumerate(details, 1)
+        ],
+    }
+
+
+def test_tracker_store_applies_deltas_and_events():
+    store = easypost.TrackerStore()
+
+    new = store.apply(tracker_payload('trk_1', 'pre_transit', ['pre_transit'], '2021-01-01T00:00:00Z'))
+    assert [detail['status'] for detail in new] == ['pre_transit']
+
+    event = easypost.Event.receive(json.dumps({
+        'object': 'Event',
+        'id': 'evt_1',
+        'description': 'tracker.updated',
+        'result': tracker_payload('trk_1', 'in_transit', ['pre_transit', 'in_transit'], '2021-01-02T00:00:00Z'),
+    }))
+    assert store.handle_event(event)
+    assert [detail['status'] for detail in store.details('trk_1')] == ['pre_transit', 'in_transit']
+
+    # a late, older delivery adds nothing and does not roll the status back
+    assert store.apply(tracker_payload('trk_1', 'pre_transit', ['pre_transit'], '2021-01-01T00:00:00Z')) == []
+
+    tracker = store.by_tracking_code('EZ1000000001')[0]
+    assert isinstance(tracker, easypost.Tracker)
+    assert tracker.status == 'in_transit'
+    assert len(tracker.tracking_details) == 2
+    assert [t.id for t in store.by_shipment('shp_1')] == ['trk_1']
+    assert store.with_status('pre_transit') == []
+    assert store.counts() == {'in_transit': 1}
+    assert store.get('trk_missing') is None
+
+
+def test_tracker_store_sync_pages_all_updated():
+    pages = [
+        {'trackers': [tracker_payload('trk_1', 'in_transit', ['in_transit'], '2021-01-02T00:00:00Z')],
+         'has_more': True},
+        {'trackers': [tracker_payload('trk_2', 'delivered', ['delivered'], '2021-01-03T00:00:00Z',
+                                      tracking_code='EZ4000000004', shipment_id='shp_2')],
+         'has_more': False},
+    ]
+    store = easypost.TrackerStore()
+
+    with mock.patch('easypost.Requestor.request', side_effect=[(page, 'key') for page in pages]) as request:
+        assert store.sync() == 2
+    assert [call[0][2]['page'] for call in request.call_args_list] == [1, 2]
+    assert store.by_tracking_code('EZ4000000004')[0].status == 'delivered'
+
+    with mock.patch('easypost.Requestor.request', return_value=({'trackers': [], 'has_more': False}, 'key')) as request:
+        assert store.sync() == 0
+    assert request.call_args[0][2]['start_datetime'] == '2021-01-03T00:00:00Z'
+
+
+def test_tracker_store_sync_watermark_ignores_events():
+    store = easypost.TrackerStore()
+    event = easypost.Event.receive(json.dumps({
+        'object': 'Event',
+        'description': 'tracker.updated',
+        'result': tracker_payload('trk_2', 'in_transit', ['in_transit'], '2021-01-05T00:00:00Z'),
+    }))
+    assert store.handle_event(event)
+
+    # a newer event does not let the next sync skip trackers whose events were missed
+    page = {'trackers': [tracker_payload('trk_1', 'in_transit', ['in_transit'], '2021-01-02T00:00:00Z')],
+            'has_more': True}
+    with mock.patch('easypost.Requestor.request', side_effect=[(page, 'key'), easypost.APIConnectionError('down')]):
+        with pytest.raises(easypost.APIConnectionError):
+            store.sync()
+    assert store.synced_until is None
+
+    with mock.patch('easypost.Requestor.request', return_value=(dict(page, has_more=False), 'key')) as request:
+        assert store.sync() == 1
+    assert 'start_datetime' not in request.call_args[0][2]
+    assert store.synced_until == '2021-01-02T00:00:00Z'
@@ -1,5 +1,10 @@
 # Unit tests related to 'Webhook' (https://www.easypost.com/webhooks-guide).
 
+import hashlib
+import hmac
+import json
+import threading
+
 import easypost
 import pytest
 
@@ -39,3 +44,112 @@ def test_webhooks(per_run_unique):
 
     assert exception_context.value.http_status == 404
     assert exception_context.value.message == "The requested resource could not be found."
+
+
+def event_payload(event_id, description, result=None):
+    return json.dumps({
+        'object': 'Event',
+        'id': event_id,
+        'description': description,
+        'result': result or {'object': 'Tracker', 'id': 'trk_123', 'status': 'in_transit'},
+    }).encode('utf-8')
+
+
+def test_event_receive_accepts_bytes_and_api_key():
+    event = easypost.Event.receive(event_payload('evt_1', 'tracker.updated'), 'EZTK-LOCAL')
+
+    assert isinstance(event, easypost.Event)
+    assert isinstance(event.result, easypost.Tracker)
+    assert event.result._api_key == 'EZTK-LOCAL'
+
+
+def test_event_ingestor_routes_and_deduplicates():
+    ingestor = easypost.EventIngestor(workers=3)
+    trackers = []
+    everything = []
+    lock = threading.Lock()
+
+    @ingestor.on('tracker.updated')
+    def on_tracker(event):
+        with lock:
+            trackers.append(event.id)
+
+    ingestor.on('*', lambda event: everything.append(event.id))
+    ingestor.on('batch.updated', lambda event: 1 / 0)
+    ingestor.start()
+
+    for event_id in ('evt_1', 'evt_2', 'evt_1', 'evt_3'):
+        ingestor.submit(event_payload(event_id, 'tracker.updated'))
+    ingestor.submit(event_payload('evt_4', 'batch.updated'))
+    ingestor.join()
+    ingestor.stop()
+
+    assert sorted(trackers) == ['evt_1', 'evt_2', 'evt_3']
+    assert sorted(everything) == ['evt_1', 'evt_2', 'evt_3', 'evt_4']
+    assert ingestor.stats['duplicates'] == 1
+    assert ingestor.stats['failed'] == 1
+
+
+def test_event_ingestor_applies_backpressure():
+    ingestor = easypost.EventIngestor(workers=1, queue_size=1)
+    ingestor.on('*', lambda event: None)
+
+    # no workers are running yet, so the queue fills up
+    ingestor.submit(event_payload('evt_1', 'tracker.updated'))
+    with pytest.raises(easypost.Error):
+        ingestor.submit(event_payload('evt_2', 'tracker.updated'), block=False)
+    assert ingestor.stats['rejected'] == 1
+
+    ingestor.start()
+    ingestor.join()
+    # the rejected event is accepted when EasyPost retries it
+    assert ingestor.submit(event_payload('evt_2', 'tracker.updated')) is not None
+    ingestor.join()
+    ingestor.stop()
+    assert ingestor.stats['handled'] == 2
+
+
+def sign(body, secret):
+    return 'hmac-sha256-hex=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+def test_webhook_verifier_accepts_rotated_secrets():
+    body = event_payload('evt_1', 'tracker.updated')
+    verifier = easypost.WebhookVerifier(['new-secret', 'old-secret'])
+
+    for secret in ('new-secret', 'old-secret'):
+        event = verifier.verify(body, {'x-hmac-signature': sign(body, secret)})
+        assert event.id == 'evt_1'
+
+    with pytest.raises(easypost.SignatureVerificationError):
+        verifier.verify(body, {'X-Hmac-Signature': sign(body, 'retired-secret')})
+    with pytest.raises(easypost.SignatureVerificationError):
+        verifier.verify(body + b' ', {'X-Hmac-Signature': sign(body, 'new-secret')})
+    with pytest.raises(easypost.SignatureVerificationError):
+        verifier.verify(body, {})
+
+
+def test_webhook_verifier_normalizes_secret():
+    body = event_payload('evt_1', 'tracker.updated')
+    # the composed and decomposed forms of the same secret sign identically
+    verifier = easypost.WebhookVerifier(u'caf\u00e9')
+
+    assert verifier.is_valid(body, sign(body, u'cafe\u0301'))
+
+
+def test_webhook_verifier_batch_and_ingestor():
+    good = event_payload('evt_1', 'tracker.updated')
+    bad = event_payload('evt_2', 'tracker.updated')
+    verifier = easypost.WebhookVerifier('secret')
+
+    results = verifier.verify_all([
+        (good, {'X-Hmac-Signature': sign(good, 'secret')}),
+        (bad, {'X-Hmac-Signature': sign(good, 'secret')}),
+    ])
+    assert results[0].id == 'evt_1'
+    assert isinstance(results[1], easypost.SignatureVerificationError)
+
+    ingestor = easypost.EventIngestor(verifier=verifier)
+    with pytest.raises(easypost.SignatureVerificationError):
+        ingestor.submit(bad, headers={'X-Hmac-Signature': 'hmac-sha256-hex=00'})
+    assert ingestor.submit(good, headers={'X-Hmac-Signature': sign(good, 'secret')}).id == 'evt_1'